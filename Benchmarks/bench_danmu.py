@@ -0,0 +1,88 @@
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from Scripts.RateWindow import DanmuWindow
+
+# 弹幕计数微基准：模拟每分钟10000条弹幕，对比原有的列表实现与DanmuWindow
+# 用法：python -m Benchmarks.bench_danmu [--rate 10000] [--minutes 10]
+
+def gen_danmu(rate, minutes, seed=0):
+    # 生成 (时间, 内容) 序列：一半为高频重复内容（刷屏），一半为各不相同的内容
+    rng = random.Random(seed)
+    hot = ["1", "2", "666", "收到", "老师好", "a", "b", "c", "d", "明白"]
+    interval = 60.0 / rate
+    now = 1000000.0
+    for i in range(rate * minutes):
+        now += interval
+        if rng.random() < 0.5:
+            yield now, rng.choice(hot)
+        else:
+            yield now, "unique-%d" % i
+
+def run_list(events, limit):
+    # 原有实现：每个内容一个时间戳列表，遍历中remove
+    danmu_dict = {}
+    sent_danmu_dict = {}
+    sent = 0
+    for now, content in events:
+        try:
+            same_content_ls = danmu_dict[content]
+        except KeyError:
+            danmu_dict[content] = []
+            same_content_ls = danmu_dict[content]
+        for i in same_content_ls:
+            if now - i > 60:
+                same_content_ls.remove(i)
+        if content not in sent_danmu_dict.keys() or now - sent_danmu_dict[content] > 60:
+            if len(same_content_ls) + 1 >= limit:
+                sent += 1
+                same_content_ls = []
+                sent_danmu_dict[content] = now
+            else:
+                same_content_ls.append(now)
+    return sent, len(danmu_dict)
+
+def run_window(events, limit):
+    # DanmuWindow实现，与Lesson.on_message中的逻辑一致
+    window = DanmuWindow()
+    sent = 0
+    for now, content in events:
+        if not window.sent_recently(content, now):
+            if window.count(content, now) + 1 >= limit:
+                sent += 1
+                window.reset(content)
+                window.mark_sent(content, now)
+            else:
+                window.add(content, now)
+    return sent, len(window)
+
+def bench(name, func, events, limit):
+    start = time.perf_counter()
+    sent, keys = func(events, limit)
+    elapsed = time.perf_counter() - start
+    # 内存单独测量，避免tracemalloc影响计时
+    tracemalloc.start()
+    func(events, limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-8s %8.3fs  %10.0f 条/秒  自动发送 %5d  剩余内容数 %7d  峰值内存 %7.1f MB" % (name, elapsed, len(events) / elapsed, sent, keys, peak / 1024 / 1024))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="弹幕计数微基准")
+    parser.add_argument("--rate", type=int, default=10000, help="每分钟弹幕数")
+    parser.add_argument("--minutes", type=int, default=10, help="模拟时长（分钟）")
+    parser.add_argument("--limit", type=int, default=5, help="跟风发送阈值")
+    args = parser.parse_args(argv)
+    events = list(gen_danmu(args.rate, args.minutes))
+    print("共 %d 条弹幕（%d 条/分钟，%d 分钟）" % (len(events), args.rate, args.minutes))
+    # 阈值很高时不会触发发送，相同内容的记录持续累积，是原有实现的最坏情况
+    for limit in (args.limit, 10 ** 9):
+        print("阈值 %d：" % limit)
+        bench("list", run_list, events, limit)
+        bench("window", run_window, events, limit)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import typing
+import argparse
+from Scripts import Decoder
+
+# JSON解码后端对比：hello帧、presentation/fetch响应、弹幕帧
+# 用法：python -m Benchmarks.bench_json [--number 200] [--file captured.jsonl]
+# --file 可传入每行一个原始JSON文本的文件（例如抓取的真实帧），替换内置的样例数据
+
+def sample_hello(entries=300):
+    # 与雨课堂hello帧结构一致的样例：较长的timeline与已解锁题目
+    timeline = []
+    for i in range(entries):
+        if i % 10 == 0:
+            timeline.append({"type": "problem", "prob": str(9000 + i), "pres": "123456", "si": i, "dt": 1700000000000 + i})
+        else:
+            timeline.append({"type": "slide", "pres": "12345%d" % (i % 5), "si": i, "sid": str(800000 + i), "dt": 1700000000000 + i})
+    return json.dumps({
+        "op": "hello", "timeline": timeline, "presentation": "123456", "slideindex": 12,
+        "unlockedproblem": [str(9000 + i) for i in range(0, entries, 10)],
+    }, ensure_ascii=False)
+
+def sample_presentation(slides=300):
+    # 与presentation/fetch响应结构一致的样例：每页含缩略图、形状，部分页含题目
+    data = []
+    for i in range(slides):
+        slide = {
+            "id": str(800000 + i), "index": i, "cover": "https://example.invalid/%d.png" % i,
+            "thumbnail": "https://example.invalid/%d_thumb.png" % i, "width": 1280, "height": 720,
+            "shapes": [{"type": "text", "text": "第%d页内容 %d" % (i, k), "left": k * 10, "top": k * 20} for k in range(6)],
+        }
+        if i % 10 == 0:
+            slide["problem"] = {
+                "problemId": str(9000 + i), "problemType": 1, "content": "第%d题题干" % i, "score": 100,
+                "options": [{"key": key, "value": "选项%s" % key} for key in "ABCD"], "answers": ["A"],
+            }
+        data.append(slide)
+    return json.dumps({"code": 0, "msg": "OK", "data": {"title": "示例课件", "width": 1280, "height": 720, "slides": data}}, ensure_ascii=False)
+
+def sample_danmu():
+    return json.dumps({"op": "newdanmu", "danmu": "老师讲得好", "userid": 1234567, "sid": "abcdef", "dt": 1700000000000}, ensure_ascii=False)
+
+# 对照：使用msgspec将已知的websocket消息直接解码为结构体（按op区分），字段缺失时使用默认值，未知op回退为dict
+if Decoder.msgspec is not None:
+    msgspec = Decoder.msgspec
+
+    class Hello(msgspec.Struct, tag_field="op", tag="hello"):
+        timeline: list = []
+        presentation: object = None
+        unlockedproblem: list = []
+
+    class UnlockProblem(msgspec.Struct, tag_field="op", tag="unlockproblem"):
+        problem: dict = {}
+
+    class PresentationUpdated(msgspec.Struct, tag_field="op", tag="presentationupdated"):
+        presentation: object = None
+
+    class PresentationCreated(msgspec.Struct, tag_field="op", tag="presentationcreated"):
+        presentation: object = None
+
+    class NewDanmu(msgspec.Struct, tag_field="op", tag="newdanmu"):
+        danmu: str = ""
+        userid: object = None
+
+    class CallPaused(msgspec.Struct, tag_field="op", tag="callpaused"):
+        name: str = ""
+
+    class ProblemInfo(msgspec.Struct, tag_field="op", tag="probleminfo"):
+        problemid: object = None
+        limit: object = None
+        now: object = None
+        dt: object = None
+
+    class LessonFinished(msgspec.Struct, tag_field="op", tag="lessonfinished"):
+        pass
+
+    KNOWN_OPS = (Hello, UnlockProblem, PresentationUpdated, PresentationCreated, NewDanmu, CallPaused, ProblemInfo, LessonFinished)
+    _typed_decoder = msgspec.json.Decoder(typing.Union[KNOWN_OPS])
+
+    def decode_typed(data):
+        # 将已知op的消息解码为结构体，其他消息返回dict
+        try:
+            return _typed_decoder.decode(data)
+        except msgspec.ValidationError:
+            return Decoder.decode(data)
+else:
+    decode_typed = None
+
+def bench(payloads, number):
+    # 对每个后端解码全部样例number次，输出每次解码的平均耗时
+    decoders = dict(Decoder.BACKENDS)
+    if decode_typed is not None:
+        decoders["msgspec-typed"] = decode_typed
+    for label, text in payloads:
+        raw = text.encode("utf-8")
+        print("%s（%d 字节）" % (label, len(raw)))
+        for name, func in decoders.items():
+            start = time.perf_counter()
+            for _ in range(number):
+                func(raw)
+            per_call = (time.perf_counter() - start) / number
+            print("  %-14s %10.1f us" % (name, per_call * 1e6))
+        # 原有实现：先解码为str再额外复制一次dict
+        start = time.perf_counter()
+        for _ in range(number):
+            dict(json.loads(text))
+        legacy = (time.perf_counter() - start) / number
+        print("  %-14s %10.1f us（原有实现 dict(json.loads(text))）" % ("legacy", legacy * 1e6))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON解码后端对比")
+    parser.add_argument("--number", type=int, default=200, help="每个样例的解码次数")
+    parser.add_argument("--file", help="每行一个JSON文本的样例文件")
+    args = parser.parse_args(argv)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            payloads = [("第%d行" % (i + 1), line.strip()) for i, line in enumerate(f) if line.strip()]
+    else:
+        payloads = [("hello", sample_hello()), ("presentation/fetch", sample_presentation()), ("newdanmu", sample_danmu())]
+    print("可用后端：%s，当前默认：%s" % (", ".join(Decoder.BACKENDS), Decoder.backend))
+    bench(payloads, args.number)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
 import sys
+import multiprocessing
 from PyQt5 import QtWidgets
 from UI.MainWindow import MainWindow_Ui
 
 if __name__ == "__main__":
+    # 打包后的程序启动多进程监听的工作进程时需要
+    multiprocessing.freeze_support()
     # 初始化
     app = QtWidgets.QApplication(sys.argv)
     main = QtWidgets.QMainWindow()
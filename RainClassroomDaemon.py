@@ -0,0 +1,72 @@
+import sys
+import json
+import signal
+import argparse
+import threading
+import multiprocessing
+from Scripts import Http, Profiler
+from Scripts.Sink import JsonLinesSink
+from Scripts.Monitor import monitor
+from Scripts.Utils import get_initial_data, get_user_info
+
+# 无界面守护进程入口：不加载PyQt5与pyttsx3，事件以JSON Lines输出
+
+def load_config(config_path):
+    # 读取配置文件，缺失的配置项使用默认值
+    config = get_initial_data()
+    with open(config_path,"r",encoding="utf-8") as f:
+        config.update(json.load(f))
+    return config
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="雨课堂小助手无界面模式")
+    parser.add_argument("config", help="配置文件路径（与图形界面使用相同的config.json格式）")
+    parser.add_argument("-o", "--output", help="事件输出文件，默认输出到stdout")
+    parser.add_argument("--record", help="录制websocket帧与REST响应到指定文件（.jsonl.gz），供Scripts.Replay回放")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    # 登录检查在monitor之前进行，需要先应用接口地址配置
+    Http.set_base_urls(config.get("api_base"), config.get("wss_url"))
+    if args.record:
+        config["record_path"] = args.record
+    stream = open(args.output,"a",encoding="utf-8") if args.output else sys.stdout
+    sink = JsonLinesSink(config, stream)
+
+    code, user_info = get_user_info(config["sessionid"],fresh=True)
+    if code != 0:
+        sink.add_message("登录状态失效，请更新配置文件中的sessionid",0)
+        return 1
+    sink.add_message("登录成功，当前登录用户："+user_info["name"],0)
+
+    def stop(signum, frame):
+        # 信号处理在主线程中执行，可能正持有锁，交给新线程去停止监听，避免死锁
+        threading.Thread(target=sink.stop, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    if hasattr(signal, "SIGHUP"):
+        def reload(signum, frame):
+            # 重新读取工作进程数，多进程监听时按新的进程数迁移课程
+            try:
+                config["supervisor_workers"] = load_config(args.config)["supervisor_workers"]
+            except (OSError, ValueError):
+                pass
+        signal.signal(signal.SIGHUP, reload)
+    if hasattr(signal, "SIGUSR1"):
+        def profile(signum, frame):
+            # 按配置项profile_mode与profile_seconds对消息处理进行一次性能分析
+            threading.Thread(target=Profiler.start, args=(sink, config), daemon=True).start()
+        signal.signal(signal.SIGUSR1, profile)
+
+    sink.is_active = True
+    sink.add_message("启动成功",0)
+    monitor(sink)
+    sink.add_message("停止成功",0)
+    if stream is not sys.stdout:
+        stream.close()
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import time
+import asyncio
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from Scripts.Utils import get_on_lesson
+from Scripts import Http, Metrics
+from Scripts.Classes import Lesson
+from Scripts.Scheduler import get_scheduler
+from Scripts.Timetable import get_timetable
+
+# 可选的asyncio监听引擎：所有课程的websocket、上课列表轮询都运行在同一个事件循环上，
+# 不再为每个课程单独开线程。依赖aiohttp，未安装时回退到线程模式。
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# 阻塞的REST调用（签到、课程信息）统一放入有界线程池执行，消息处理由Dispatcher完成
+EXECUTOR_WORKERS = 16
+NETWORK_RETRY_INTERVAL = 5
+# 关闭握手的等待时间（秒），避免失效连接的close()长时间挂起
+WS_CLOSE_TIMEOUT = 1
+
+def async_available():
+    # 是否可以使用asyncio引擎
+    return aiohttp is not None
+
+class _AsyncSocket:
+    # 包装aiohttp的websocket，提供与websocket.WebSocketApp一致的send/close接口，
+    # 可以在任意线程中调用，实际操作被调度回事件循环
+    def __init__(self, loop, ws):
+        self.loop = loop
+        self.ws = ws
+
+    def _schedule(self, coro):
+        if self.loop.is_closed():
+            coro.close()
+            return
+        asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def send(self, text):
+        self._schedule(self.ws.send_str(text))
+
+    def close(self, timeout=None):
+        # 关闭握手的等待时间在建立连接时设置（WS_CLOSE_TIMEOUT），这里的timeout仅为兼容WebSocketApp.close
+        self._schedule(self.ws.close())
+
+class AsyncEngine:
+    def __init__(self, sinks):
+        # sinks: 各账号的EventSink，每个账号各自轮询上课列表，共用事件循环、线程池与aiohttp会话
+        self.sinks = sinks
+        self.sink = sinks[0]
+        # Lesson.key -> Lesson
+        self.lessons = {}
+        self.tasks = set()
+        self.timetable = get_timetable(self.sink.config)
+
+    def run(self):
+        # 在当前线程中运行事件循环，直到停止监听
+        asyncio.run(self._main())
+
+    async def _call(self, func, *args):
+        # 在线程池中执行阻塞调用
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        # 停止监听时由调用stop()的线程通知事件循环，等待中的课程与轮询不占用线程
+        self.stopped = asyncio.Event()
+        self.sink.on_stop(self._notify_stopped)
+        self.executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="lesson-io")
+        try:
+            # 会话只用于websocket（REST走Http的连接池），每个课程占用一个连接，不限制连接数
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+                self.session = session
+                await asyncio.gather(*(self._discover(sink) for sink in self.sinks))
+                # 停止监听：关闭全部连接并等待各课程任务结束
+                for lesson_obj in list(self.lessons.values()):
+                    lesson_obj.close_socket()
+                if self.tasks:
+                    await asyncio.gather(*self.tasks, return_exceptions=True)
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def _discover(self, sink):
+        # 单个账号的上课列表轮询
+        sessionid = sink.config["sessionid"]
+        scheduler = get_scheduler(sink.config)
+        # 以往记录的上课时间作为密集轮询的时段
+        for start in self.timetable.start_times():
+            scheduler.learn(start)
+        # 该账号已在监听的lessonId
+        lessonids = set()
+        network_status = True
+        while sink.is_active:
+            cycle_start = time.monotonic()
+            # 即将上课的班级提前预热
+            self.timetable.prewarm_due(sink.config, sink.account)
+            try:
+                lesson_list = await self._call(get_on_lesson, sessionid)
+            except requests.exceptions.ConnectionError:
+                if network_status:
+                    sink.add_message("网络异常，监听中断",8)
+                    network_status = False
+                await self._sleep(NETWORK_RETRY_INTERVAL)
+                continue
+            except Exception:
+                lesson_list = []
+            if not network_status:
+                network_status = True
+                sink.add_message("网络已恢复，监听开始",8)
+            found_new = False
+            for lesson in lesson_list:
+                lessonid = lesson["lessonId"]
+                if lessonid in lessonids:
+                    continue
+                try:
+                    lesson_obj = await self._call(Lesson, lessonid, lesson["courseName"], lesson["classroomId"], sink)
+                except Exception as e:
+                    # 单个课程创建失败不影响其他课程，下次轮询时重试
+                    sink.add_message("%s加入监听失败：%s" % (lesson["courseName"], e),7)
+                    continue
+                lessonids.add(lessonid)
+                self.lessons[lesson_obj.key] = lesson_obj
+                task = asyncio.create_task(self._run_lesson(lesson_obj))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+                task.add_done_callback(lambda task, lessonid=lessonid: lessonids.discard(lessonid))
+                meg = "检测到课程%s正在上课，已加入监听列表" % lesson_obj.lessonname
+                sink.add_message(meg,7)
+                scheduler.learn(time.time())
+                found_new = True
+                Metrics.LESSONS_DISCOVERED.inc()
+            Metrics.DISCOVERY_SECONDS.observe(time.monotonic() - cycle_start)
+            await self._sleep(scheduler.next_delay(found_new))
+
+    def _notify_stopped(self):
+        # 在调用stop()的线程中执行
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def _sleep(self, seconds):
+        # 可被停止监听打断的sleep
+        try:
+            await asyncio.wait_for(self.stopped.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run_lesson(self, lesson):
+        # 单个课程：签到、建立websocket、按顺序处理消息，意外断线时沿用签到结果重连
+        prepared = False
+        try:
+            await self._call(lesson.prepare_lesson)
+            prepared = True
+            while True:
+                try:
+                    await self._connect(lesson)
+                except aiohttp.ClientError as e:
+                    lesson._log_debug(f"websocket 连接异常: {e}")
+                delay = lesson.next_reconnect_delay()
+                if delay is None:
+                    break
+                await self._sleep(delay)
+        except Exception as e:
+            lesson.add_message("%s监听异常：%s" % (lesson.lessonname, e),7)
+        finally:
+            if prepared:
+                # finish_lesson会等待该课程剩余消息处理完毕，放到线程池中避免阻塞事件循环
+                await self._call(lesson.finish_lesson)
+            self.lessons.pop(lesson.key, None)
+
+    async def _connect(self, lesson):
+        # 建立一次websocket连接并接收消息，直到连接关闭
+        # 自行处理ping/pong，以便pong也能更新课程的存活时间
+        timeout = aiohttp.ClientWSTimeout(ws_close=WS_CLOSE_TIMEOUT) if hasattr(aiohttp, "ClientWSTimeout") else WS_CLOSE_TIMEOUT
+        async with self.session.ws_connect(Http.WSS_URL, headers=lesson.ws_headers, proxy=None, autoping=False, timeout=timeout) as ws:
+            lesson.wsapp = _AsyncSocket(self.loop, ws)
+            # 若在建立连接期间已停止监听，直接退出
+            if not self.sink.is_active:
+                return
+            lesson.on_open(lesson.wsapp)
+            pinger = asyncio.create_task(self._ping(ws, lesson.ping_interval)) if lesson.ping_interval else None
+            try:
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        # on_message只解析并入队，可以直接在事件循环中调用
+                        lesson.on_message(lesson.wsapp, msg.data)
+                    elif msg.type == aiohttp.WSMsgType.PING:
+                        await ws.pong(msg.data)
+                    elif msg.type == aiohttp.WSMsgType.PONG:
+                        lesson.on_pong(lesson.wsapp, msg.data)
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+            finally:
+                if pinger is not None:
+                    pinger.cancel()
+
+    async def _ping(self, ws, interval):
+        # 定期发送心跳，未收到pong时由Watchdog判定连接失效
+        while not ws.closed:
+            await asyncio.sleep(interval)
+            try:
+                await ws.ping()
+            except (ConnectionError, RuntimeError):
+                return
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from Scripts import Http, Recorder
+from Scripts.Utils import dict_result, get_cache_dir
+
+# PPT数据（presentation/fetch）的本地缓存
+# 按内容sha256存储，索引记录 presentation id -> (摘要, ETag/Last-Modified)，
+# 重新连接或重复的presentationupdated只需一次条件请求（304），无需重新下载整份PPT
+
+DEFAULT_MAX_MB = 200
+
+class PPTCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # presentation id -> 条目，按最近使用排序（末尾为最新）
+        self.index = OrderedDict()
+        # 摘要 -> 引用该内容的条目数
+        self.refs = {}
+        self.total_bytes = 0
+        self.misses = 0
+        self.not_modified = 0
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._load_index()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest + ".json")
+
+    def _load_index(self):
+        # 读取索引，丢弃内容文件已不存在的条目
+        try:
+            with open(self.index_path,"r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = []
+        for entry in sorted(entries, key=lambda e: e.get("atime", 0)):
+            if not os.path.exists(self._blob_path(entry["digest"])):
+                continue
+            self._add_entry(entry)
+
+    def _save_index(self):
+        # 原子写入索引文件，临时文件按进程区分（多进程监听时共用缓存目录）
+        tmp_path = "%s.%d.tmp" % (self.index_path, os.getpid())
+        with open(tmp_path,"w") as f:
+            json.dump(list(self.index.values()), f)
+        os.replace(tmp_path, self.index_path)
+
+    def _add_entry(self, entry):
+        digest = entry["digest"]
+        self.index[entry["id"]] = entry
+        if digest not in self.refs:
+            self.refs[digest] = 0
+            self.total_bytes += entry["size"]
+        self.refs[digest] += 1
+
+    def _drop_entry(self, presentationid):
+        self._release(self.index.pop(presentationid))
+
+    def _release(self, entry):
+        # 减少内容引用，无引用时删除内容文件
+        digest = entry["digest"]
+        self.refs[digest] -= 1
+        if self.refs[digest] == 0:
+            del self.refs[digest]
+            self.total_bytes -= entry["size"]
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+
+    def _evict(self):
+        # 超出容量时按LRU淘汰，至少保留最新的一项
+        while self.total_bytes > self.max_bytes and len(self.index) > 1:
+            oldest = next(iter(self.index))
+            self._drop_entry(oldest)
+
+    def lookup(self, presentationid):
+        # 查询条目，命中时刷新LRU顺序
+        presentationid = str(presentationid)
+        with self.lock:
+            entry = self.index.get(presentationid)
+            if entry is not None:
+                self.index.move_to_end(presentationid)
+                entry["atime"] = time.time()
+            return entry
+
+    def conditional_headers(self, entry):
+        # 根据缓存条目生成条件请求头
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, entry):
+        # 读取缓存内容，内容文件已被淘汰时返回None
+        try:
+            with open(self._blob_path(entry["digest"]),"rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, presentationid, body, etag=None, last_modified=None):
+        # 写入内容（相同内容只存一份）并更新索引
+        presentationid = str(presentationid)
+        digest = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(digest)
+        with self.lock:
+            if not os.path.exists(blob_path):
+                tmp_path = "%s.%d.tmp" % (blob_path, os.getpid())
+                with open(tmp_path,"wb") as f:
+                    f.write(body)
+                os.replace(tmp_path, blob_path)
+            old = self.index.pop(presentationid, None)
+            # 先登记新内容再释放旧内容，新旧内容相同时不会被误删
+            self._add_entry({
+                "id": presentationid,
+                "digest": digest,
+                "size": len(body),
+                "etag": etag,
+                "last_modified": last_modified,
+                "atime": time.time(),
+            })
+            if old is not None:
+                self._release(old)
+            self._evict()
+            self._save_index()
+
+    def set_limit(self, max_bytes):
+        # 调整容量（Supervisor调整工作进程数时），超出部分立即淘汰
+        with self.lock:
+            self.max_bytes = max_bytes
+            if self.total_bytes > max_bytes:
+                self._evict()
+                self._save_index()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.index),
+                "bytes": self.total_bytes,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+    def _count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def fetch(self, presentationid, headers):
+        # 获取PPT数据，返回与接口data字段相同的dict
+        url = Http.api_url("/api/v3/lesson/presentation/fetch?presentation_id=%s" % (presentationid))
+        entry = self.lookup(presentationid)
+        request_headers = dict(headers)
+        if entry is not None:
+            request_headers.update(self.conditional_headers(entry))
+        r = Http.get(url=url,headers=request_headers)
+        if r.status_code == 304 and entry is not None:
+            body = self.load(entry)
+            if body is not None:
+                self._count("not_modified")
+                if Recorder.recorder is not None:
+                    Recorder.recorder.cached("GET", url, {"ETag": entry.get("etag"), "Last-Modified": entry.get("last_modified")}, body)
+                return dict_result(body)["data"]
+            # 内容已被淘汰，重新完整获取
+            r = Http.get(url=url,headers=headers)
+        self._count("misses")
+        body = r.content
+        rtn = dict_result(body)
+        # 只缓存成功的响应
+        if r.status_code == 200 and rtn.get("code") == 0:
+            self.store(presentationid, body, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+        return rtn["data"]
+
+_cache = None
+_cache_lock = threading.Lock()
+# 为False时进程内不使用缓存（Supervisor的主进程，缓存由各工作进程各自持有）
+_enabled = True
+
+def get_ppt_cache(config):
+    # 进程内共享的PPT缓存，ppt_cache_mb为0时不使用缓存
+    global _cache
+    max_mb = config.get("ppt_cache_mb", DEFAULT_MAX_MB)
+    if not max_mb or not _enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache_dir = os.path.join(get_cache_dir(config), "ppt_cache")
+                _cache = PPTCache(cache_dir, int(max_mb) * 1024 * 1024)
+    return _cache
+
+def set_ppt_cache(cache):
+    # 替换进程内共享的PPT缓存（Supervisor的工作进程使用各自的缓存目录）
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = enabled
+
+# ---------- Supervisor工作进程 ----------
+# 多个进程共用一个缓存目录时各自读取索引、各自淘汰并覆盖索引文件，容量限制只对单个进程生效，
+# 且一个进程可能删除另一个进程仍在引用的内容文件，因此每个工作进程使用独立的子目录，容量按工作进程数均分
+
+def worker_cache_dir(config, worker_id):
+    return os.path.join(get_cache_dir(config), "ppt_cache", "worker-%d" % worker_id)
+
+def worker_cache_bytes(config, workers):
+    # 每个工作进程的缓存容量
+    max_mb = config.get("ppt_cache_mb", DEFAULT_MAX_MB)
+    return int(max_mb) * 1024 * 1024 // max(1, workers)
+
+def open_worker_cache(config, worker_id, workers):
+    # 工作进程的PPT缓存，ppt_cache_mb为0时返回None
+    if not config.get("ppt_cache_mb", DEFAULT_MAX_MB):
+        return None
+    return PPTCache(worker_cache_dir(config, worker_id), worker_cache_bytes(config, workers))
+
+def remove_worker_cache(config, worker_id):
+    # 删除已退出的工作进程的缓存目录
+    shutil.rmtree(worker_cache_dir(config, worker_id), ignore_errors=True)
+
+def remove_worker_caches(config, keep=0):
+    # 删除编号不小于keep的工作进程缓存目录（上次运行时多出的工作进程）
+    root = os.path.join(get_cache_dir(config), "ppt_cache")
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    for name in names:
+        prefix, _, number = name.partition("-")
+        if prefix == "worker" and number.isdigit() and int(number) >= keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
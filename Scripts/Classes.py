@@ -1,48 +1,111 @@
-import requests
 import threading
 import time
+import random
+import socket
+import requests
 import websocket
 import json
+from concurrent.futures import ThreadPoolExecutor
+from Scripts import Http, Recorder, Metrics, Profiler
 from Scripts.Utils import get_user_info, dict_result
+from Scripts.Cache import get_ppt_cache
+from Scripts.RateWindow import DanmuWindow
+from Scripts.Directory import get_directory
+from Scripts.Dispatcher import get_dispatcher
+from Scripts.Timetable import get_timetable
+from Scripts.Watchdog import get_watchdog, heartbeat_config
+
+# 签到重试：首次失败后等待CHECKIN_BASE_DELAY秒，每次翻倍（带抖动）至多CHECKIN_MAX_DELAY秒，
+# 包括重试在内的总耗时不超过CHECKIN_BUDGET秒
+CHECKIN_BUDGET = 15
+CHECKIN_BASE_DELAY = 0.2
+CHECKIN_MAX_DELAY = 2
+# websocket断线重连：沿用签到得到的lessonToken，等待时间从RECONNECT_BASE_DELAY秒起翻倍（带抖动）
+# 至多RECONNECT_MAX_DELAY秒，连续RECONNECT_ATTEMPTS次未能连上时视为课程结束
+RECONNECT_ATTEMPTS = 5
+RECONNECT_BASE_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+# 失效连接的关闭握手等待时间（秒），对端通常不会再回应close帧
+CLOSE_TIMEOUT = 1
+
+# hello时并发获取PPT的线程数（所有课程共用）
+PPT_FETCH_WORKERS = 4
+
+_ppt_executor = ThreadPoolExecutor(max_workers=PPT_FETCH_WORKERS, thread_name_prefix="ppt-fetch")
+
+def lesson_key(lessonid, account=None):
+    # 监听列表、分发队列与存活检查中的键：多个账号可能在同一课程中，需要区分账号
+    return lessonid if account is None else "%s/%s" % (account, lessonid)
 
-wss_url = "wss://changjiang.yuketang.cn/wsapp/"
 class Lesson:
-    def __init__(self,lessonid,lessonname,classroomid,main_ui):
+    def __init__(self,lessonid,lessonname,classroomid,sink):
         self.classroomid = classroomid
         self.lessonid = lessonid
         self.lessonname = lessonname
-        self.sessionid = main_ui.config["sessionid"]
-        self.headers = {
-            "Cookie":"sessionid=%s" % self.sessionid,
-            "User-Agent":"Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0",
-        }
+        self.key = lesson_key(lessonid, sink.account)
+        self.sessionid = sink.config["sessionid"]
+        self.headers = Http.auth_headers(self.sessionid)
+        # websocket握手不经过Http会话，需要单独带上User-Agent
+        self.ws_headers = dict(self.headers, **{"User-Agent":Http.USER_AGENT})
         self.receive_danmu = {}
-        self.sent_danmu_dict = {}
-        self.danmu_dict = {}
+        self.danmu_window = DanmuWindow()
         self.unlocked_problem = []
+        # 已处理过的timeline条目与已解锁题目，重连后的hello只处理新增部分
+        self.timeline_seen = set()
+        self.unlocked_seen = set()
+        # 连接状态：收到lessonfinished后不再重连
+        self.finished = False
+        # 多进程监听时课程迁移到其他工作进程：课程仍在进行，结束时不记录下课
+        self.migrating = False
+        self.connected = False
+        self.reconnect_attempts = 0
+        # 心跳与存活检查：超过stale_limit秒未收到任何消息或pong视为连接已失效
+        self.ping_interval, self.ping_timeout = heartbeat_config(sink.config)
+        self.stale_limit = self.ping_interval + self.ping_timeout
+        self.last_received = time.monotonic()
+        self.watchdog = get_watchdog()
+        # 监听列表中显示的统计：收到的消息数、处理延迟（秒，指数平滑）、重连次数
+        self.message_count = 0
+        self.latency = None
+        self.reconnect_count = 0
+        # 就绪耗时：从开始签到到首次hello中的全部PPT解析完毕（秒）
+        self.ready_started = None
+        self.ready_latency = None
+        self.ppt_pending = 0
+        # 已提交到_ppt_executor、尚未重新入队的获取任务
+        self.ppt_futures = set()
+        self.ppt_futures_cond = threading.Condition()
         self.problem_cache = {}
         self.problem_page_map = {}
+        # presentation id -> {页码: 题目id}
         self.ppt_problem_pages = {}
+        self.ppt_slide_count = {}
         self.current_presentation_page = {}
         self.notified_problems = set()
         self.auto_answer_warned = False
-        self.debug_mode = bool(main_ui.config.get("debug_mode", False))
+        self.debug_mode = bool(sink.config.get("debug_mode", False))
         self._seen_content_types = set()
         self._seen_answers_types = set()
-        self.classmates_ls = []
-        self.add_message = main_ui.add_message_signal.emit
-        self.add_course = main_ui.add_course_signal.emit
-        self.del_course = main_ui.del_course_signal.emit
-        self.config = main_ui.config
+        self.classmates = get_directory(classroomid, sink.config)
+        self.dispatcher = get_dispatcher(sink.config)
+        self.add_message = sink.add_message
+        self.add_course = sink.add_course
+        self.del_course = sink.del_course
+        self.config = sink.config
+        self.ppt_cache = get_ppt_cache(self.config)
+        self.timetable = get_timetable(self.config)
+        self.checkin_latency = None
         code, rtn = get_user_info(self.sessionid)
         self.user_uid = rtn["id"]
         self.user_uname = rtn["name"]
-        self.main_ui = main_ui
+        self.sink = sink
 
     def _get_ppt(self,presentationid):
-        # 获取课程各页ppt
-        r = requests.get(url="https://changjiang.yuketang.cn/api/v3/lesson/presentation/fetch?presentation_id=%s" % (presentationid),headers=self.headers,proxies={"http": None,"https":None})
-        return dict_result(r.text)["data"]
+        # 获取课程各页ppt，启用缓存时使用条件请求
+        if self.ppt_cache is not None:
+            return self.ppt_cache.fetch(presentationid,self.headers)
+        r = Http.get(url=Http.api_url("/api/v3/lesson/presentation/fetch?presentation_id=%s" % (presentationid)),headers=self.headers)
+        return dict_result(r.content)["data"]
 
     def _log_debug(self, message):
         if self.debug_mode:
@@ -138,10 +201,12 @@ class Lesson:
             self.current_presentation_page[presentation_id] = page_no
         self.add_message(f"{self.lessonname} 当前 PPT 第{page_no}页", 0)
 
-    def get_problems(self, presentationid):
+    def get_problems(self, presentationid, future=None):
         # 获取课程ppt中的题目，只汇总题目所在页码
+        # 每个PPT保存 页码 -> 题目id 的索引，更新时题目id未变的页只刷新题目内容，不再重复解析
+        # future: 已提交到_ppt_executor的获取任务，为None时在当前线程获取
         try:
-            data = self._get_ppt(presentationid)
+            data = future.result() if future is not None else self._get_ppt(presentationid)
             slides = data.get("slides")
             if not isinstance(slides, list):
                 self.add_message(f"{self.lessonname} 读取 PPT {presentationid} 数据失败：缺少有效的 slides", 4)
@@ -149,11 +214,15 @@ class Lesson:
                 return []
 
             total_slides = len(slides)
-            self.add_message(f"{self.lessonname} PPT {presentationid} 共 {total_slides} 页", 0)
+            if self.ppt_slide_count.get(presentationid) != total_slides:
+                self.ppt_slide_count[presentationid] = total_slides
+                self.add_message(f"{self.lessonname} PPT {presentationid} 共 {total_slides} 页", 0)
 
-            problem_pages = self.ppt_problem_pages.setdefault(presentationid, set())
-            pages_before = set(problem_pages)
-            added_pages = set()
+            is_new = presentationid not in self.ppt_problem_pages
+            old_pages = self.ppt_problem_pages.get(presentationid, {})
+            problem_pages = {}
+            added_pages = []
+            replaced = False
 
             for index, slide in enumerate(slides):
                 problem = slide.get("problem")
@@ -168,9 +237,18 @@ class Lesson:
                     continue
 
                 page_no = index + 1
-                if page_no not in problem_pages:
-                    added_pages.add(page_no)
-                problem_pages.add(page_no)
+                old = old_pages.get(page_no)
+                if old == problem_id:
+                    # 同一题目：沿用已有记录，只更新题目内容
+                    problem_pages[page_no] = old
+                    self.problem_cache[problem_id] = problem
+                    continue
+
+                if old is None:
+                    added_pages.append(page_no)
+                else:
+                    replaced = True
+                problem_pages[page_no] = problem_id
                 self.problem_page_map[problem_id] = page_no
 
                 content_type = type(problem.get("content")).__name__
@@ -186,16 +264,30 @@ class Lesson:
 
                 self.problem_cache[problem_id] = problem
 
+            # 清理已被删除或替换的题目
+            removed_pages = [page_no for page_no in old_pages if page_no not in problem_pages]
+            if removed_pages or replaced:
+                current_ids = set(problem_pages.values())
+                for problem_id in old_pages.values():
+                    if problem_id not in current_ids:
+                        self.problem_page_map.pop(problem_id, None)
+                        self.problem_cache.pop(problem_id, None)
+            self.ppt_problem_pages[presentationid] = problem_pages
+
             if problem_pages:
                 pages_text = ", ".join(str(page) for page in sorted(problem_pages))
-                if not pages_before:
+                if is_new or not old_pages:
                     self.add_message(f"{self.lessonname} PPT {presentationid} 题目页数：{pages_text}", 0)
-                elif added_pages:
-                    added_text = ", ".join(str(page) for page in sorted(added_pages))
-                    self.add_message(f"{self.lessonname} PPT {presentationid} 题目页数更新：{pages_text}（新增 {added_text}）", 0)
+                elif added_pages or removed_pages:
+                    changes = []
+                    if added_pages:
+                        changes.append("新增 " + ", ".join(str(page) for page in sorted(added_pages)))
+                    if removed_pages:
+                        changes.append("移除 " + ", ".join(str(page) for page in sorted(removed_pages)))
+                    self.add_message(f"{self.lessonname} PPT {presentationid} 题目页数更新：{pages_text}（{'，'.join(changes)}）", 0)
                 else:
                     self._log_debug(f"PPT {presentationid} 题目页数无变化")
-            else:
+            elif is_new or removed_pages:
                 self.add_message(f"{self.lessonname} PPT {presentationid} 暂未发现题目", 0)
 
             return sorted(problem_pages)
@@ -206,84 +298,260 @@ class Lesson:
             return []
 
     def on_open(self, wsapp):
+        # 重连期间已停止监听（或课程已移交其他工作进程）时直接关闭
+        if not self.sink.is_active or self.finished:
+            wsapp.close()
+            return
+        if self.reconnect_attempts:
+            self.reconnect_count += 1
+            self.add_message("%s重连成功" % self.lessonname,8)
+        self.last_received = time.monotonic()
+        self.connected = True
         self.handshark = {"op":"hello","userid":self.user_uid,"role":"student","auth":self.auth,"lessonid":self.lessonid}
         wsapp.send(json.dumps(self.handshark))
 
+    def on_pong(self, wsapp, data):
+        self.last_received = time.monotonic()
+
+    def staleness(self, now=None):
+        # 距最后一次收到消息或pong的秒数
+        if now is None:
+            now = time.monotonic()
+        return now - self.last_received
+
+    def check_liveness(self, now=None):
+        # 由Watchdog定期调用：连接超过stale_limit秒无数据时主动断开以触发重连，返回是否断开
+        if not self.connected or not self.stale_limit:
+            return False
+        stale = self.staleness(now)
+        if stale <= self.stale_limit:
+            return False
+        self.add_message("%s连接%.0f秒无响应，重新连接" % (self.lessonname, stale),8)
+        self.last_received = time.monotonic()
+        Metrics.RECONNECTS.inc("stale")
+        self.close_socket()
+        return True
+
+    def close_socket(self):
+        # 在其他线程中关闭连接（存活检查、停止监听）
+        # WebSocketApp.close在关闭握手后直接关闭文件描述符，run_forever中的select要等到ping_timeout才返回，
+        # 因此先发送close帧并shutdown底层socket，使socket线程立即退出；asyncio模式下直接关闭
+        wsapp = getattr(self, "wsapp", None)
+        if wsapp is None:
+            return
+        ws = getattr(wsapp, "sock", None)
+        if ws is not None and ws.sock is not None:
+            wsapp.keep_running = False
+            try:
+                ws.send_close()
+                ws.sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+        wsapp.close(timeout=CLOSE_TIMEOUT)
+
+    def next_reconnect_delay(self):
+        # 连接断开后调用：返回重连前的等待时间；课程已结束、已停止监听或重连次数用尽时返回None
+        if self.finished or not self.sink.is_active:
+            return None
+        if self.connected:
+            # 上一次连接成功建立过，重新计数
+            self.connected = False
+            self.reconnect_attempts = 0
+        self.reconnect_attempts += 1
+        if self.reconnect_attempts > RECONNECT_ATTEMPTS:
+            return None
+        Metrics.RECONNECTS.inc("dropped" if self.reconnect_attempts == 1 else "retry")
+        delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** (self.reconnect_attempts - 1))
+        delay = random.uniform(delay / 2, delay)
+        self.add_message("%s连接断开，%.1f秒后第%d次重连" % (self.lessonname, delay, self.reconnect_attempts),8)
+        return delay
+
     def checkin_class(self):
-        r = requests.post(url="https://changjiang.yuketang.cn/api/v3/lesson/checkin",headers=self.headers,data=json.dumps({"source":5,"lessonId":self.lessonid}),proxies={"http": None,"https":None})
-        set_auth = r.headers.get("Set-Auth",None)
-        times = 1
-        while not set_auth and times <= 3:
-            set_auth = r.headers.get("Set-Auth",None)
-            times += 1
-            time.sleep(1)
+        # 签到：未取得Set-Auth或lessonToken时按带抖动的指数退避重新发出请求，总耗时不超过CHECKIN_BUDGET
+        start = time.monotonic()
+        deadline = start + CHECKIN_BUDGET
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                timeout = max(1, min(Http.DEFAULT_TIMEOUT, deadline - time.monotonic()))
+                r = Http.post(url=Http.api_url("/api/v3/lesson/checkin"),headers=self.headers,data=json.dumps({"source":5,"lessonId":self.lessonid}),timeout=timeout)
+                set_auth = r.headers.get("Set-Auth",None)
+                data = dict_result(r.content).get("data") or {}
+                lesson_token = data.get("lessonToken")
+                if set_auth and lesson_token:
+                    Metrics.CHECKIN_ATTEMPTS.inc("success")
+                    break
+                error = "HTTP %d，未返回%s" % (r.status_code, "Set-Auth" if not set_auth else "lessonToken")
+            except (requests.exceptions.RequestException, ValueError, AttributeError) as e:
+                error = e
+            Metrics.CHECKIN_ATTEMPTS.inc("failed")
+            delay = min(CHECKIN_MAX_DELAY, CHECKIN_BASE_DELAY * 2 ** (attempt - 1))
+            delay = random.uniform(delay / 2, delay)
+            if time.monotonic() + delay >= deadline:
+                raise RuntimeError("签到失败（已尝试%d次）：%s" % (attempt, error))
+            self._log_debug(f"第{attempt}次签到失败：{error}，{delay:.2f}秒后重试")
+            # 停止监听时不再重试
+            if not self.sink.wait(delay):
+                raise RuntimeError("签到中止：已停止监听")
+        self.checkin_latency = time.monotonic() - start
+        Metrics.CHECKIN_SECONDS.observe(self.checkin_latency)
+        self.add_message("%s签到成功，耗时%.0fms（第%d次请求）" % (self.lessonname, self.checkin_latency * 1000, attempt),0)
         self.headers["Authorization"] = "Bearer %s" % set_auth
-        return dict_result(r.text)["data"]["lessonToken"]
+        self.ws_headers["Authorization"] = self.headers["Authorization"]
+        return lesson_token
 
     def on_message(self, wsapp, message):
-        data = dict_result(message)
+        # 在socket线程中只解析并入队，实际处理交给分发池，避免阻塞收包
+        received = self.last_received = time.monotonic()
+        self.message_count += 1
+        if Recorder.recorder is not None:
+            Recorder.recorder.frame(self, message)
+        profiler = Profiler.session
+        data = dict_result(message) if profiler is None else profiler.call(dict_result, message)
+        op = data.get("op")
+        # 积压过多时优先丢弃他人弹幕
+        self.dispatcher.submit(self.key, self._handle_message, wsapp, data, received, droppable=op == "newdanmu")
+        if op == "lessonfinished":
+            self.finished = True
+            # 在socket线程中直接关闭连接，已入队的消息仍会在finish_lesson前处理完毕
+            wsapp.close()
+
+    def _handle_message(self, wsapp, data, received=None):
         op = data.get("op")
+        started = time.monotonic()
+        # 性能分析期间在分析器中处理，未分析时只有这一次判断
+        profiler = Profiler.session
+        try:
+            if profiler is None:
+                self._dispatch_op(wsapp, op, data)
+            else:
+                profiler.call(self._dispatch_op, wsapp, op, data)
+        except Exception as e:
+            self._log_debug(f"处理 {op} 消息异常: {e}")
+            raise
+        finally:
+            now = time.monotonic()
+            Metrics.HANDLE_SECONDS.observe(now - started, op)
+            if profiler is not None:
+                profiler.record(op, now - started)
+            if received is not None:
+                latency = now - received
+                self.latency = latency if self.latency is None else self.latency * 0.9 + latency * 0.1
+                Metrics.MESSAGE_SECONDS.observe(latency, op)
+
+    def _fetch_presentations(self, presentations, current_presentation):
+        # 并发获取多份PPT：其余PPT提交到共享线程池，当前PPT在本线程中直接获取并解析，不在线程池中排队；
+        # 其余PPT获取完成后作为该课程的消息重新入队解析，不阻塞之后的消息，解析始终在课程的分发顺序中进行
+        others = [presentationid for presentationid in presentations if presentationid != current_presentation]
+        self.ppt_pending += len(presentations)
+        for presentationid in others:
+            future = _ppt_executor.submit(self._get_ppt, presentationid)
+            with self.ppt_futures_cond:
+                self.ppt_futures.add(future)
+            future.add_done_callback(lambda future, presentationid=presentationid: self._presentation_fetched(presentationid, future))
+        if current_presentation in presentations:
+            self._apply_presentation(current_presentation)
+        if not presentations:
+            self._report_ready(0)
+
+    def _presentation_fetched(self, presentationid, future):
+        # 在_ppt_executor线程中回调：重新入队后才从ppt_futures中移除，wait_presentations返回时解析任务已在分发队列中
+        self.dispatcher.submit(self.key, self._apply_presentation, presentationid, future)
+        with self.ppt_futures_cond:
+            self.ppt_futures.discard(future)
+            self.ppt_futures_cond.notify_all()
+
+    def wait_presentations(self, timeout=None):
+        # 等待后台获取的PPT全部重新入队，之后dispatcher.wait_idle即可等到解析完毕
+        with self.ppt_futures_cond:
+            return self.ppt_futures_cond.wait_for(lambda: not self.ppt_futures, timeout)
+
+    def _apply_presentation(self, presentationid, future=None):
+        self.get_problems(presentationid, future)
+        self.ppt_pending -= 1
+        if self.ppt_pending == 0:
+            self._report_ready(len(self.ppt_problem_pages))
+
+    def _report_ready(self, count):
+        # 首次hello的PPT全部解析完毕时报告就绪耗时
+        if self.ready_latency is not None or self.ready_started is None:
+            return
+        self.ready_latency = time.monotonic() - self.ready_started
+        self.add_message("%s已就绪：%d份PPT，签到至就绪用时%.0fms" % (self.lessonname, count, self.ready_latency * 1000),0)
+
+    def stats(self):
+        # 供监听列表显示的实时统计
+        return {
+            "messages": self.message_count,
+            "latency": self.latency,
+            "reconnects": self.reconnect_count,
+            "staleness": self.staleness() if self.connected else None,
+            "ready": self.ready_latency,
+        }
+
+    def _dispatch_op(self, wsapp, op, data):
         if op == "hello":
-            timeline = data.get("timeline", [])
-            presentations = {slide.get("pres") for slide in timeline if isinstance(slide, dict) and slide.get("type") == "slide" and slide.get("pres")}
+            self.classmates.prefetch()
+            # 重连后的hello只同步断线期间新增的timeline条目与已解锁题目
+            timeline = [entry for entry in data.get("timeline", []) if isinstance(entry, dict)]
+            new_entries = []
+            for entry in timeline:
+                key = (entry.get("type"), entry.get("pres"), entry.get("si"), entry.get("prob"))
+                if key not in self.timeline_seen:
+                    self.timeline_seen.add(key)
+                    new_entries.append(entry)
+            presentations = {entry.get("pres") for entry in new_entries if entry.get("type") == "slide" and entry.get("pres")}
             current_presentation = data.get("presentation")
             if current_presentation:
-                presentations.add(current_presentation)
-            for presentationid in presentations:
-                self.get_problems(presentationid)
+                if current_presentation not in self.ppt_problem_pages:
+                    presentations.add(current_presentation)
+                self.timetable.record_presentation(self.classroomid, current_presentation)
+            if len(new_entries) < len(timeline):
+                self._log_debug(f"hello 同步：timeline 新增 {len(new_entries)}/{len(timeline)} 条")
+            self._fetch_presentations(presentations, current_presentation)
             self._handle_presentation_change(data)
             self.unlocked_problem = data.get("unlockedproblem", [])
             for problemid in self.unlocked_problem:
+                if self._normalize_problem_id(problemid) in self.unlocked_seen:
+                    continue
+                self.unlocked_seen.add(self._normalize_problem_id(problemid))
                 self._current_problem(wsapp, problemid)
         elif op == "unlockproblem":
             problem = data.get("problem", {})
             problem_id = self._resolve_problem_id(problem)
+            if problem_id is not None:
+                self.unlocked_seen.add(problem_id)
             limit = problem.get("limit")
             self._notify_problem_release(problem_id, limit)
         elif op == "lessonfinished":
             meg = "%s下课了" % self.lessonname
             self.add_message(meg,7)
-            wsapp.close()
         elif op == "presentationupdated":
             self.get_problems(data.get("presentation"))
             self._handle_presentation_change(data)
         elif op == "presentationcreated":
+            self.timetable.record_presentation(self.classroomid, data.get("presentation"))
             self.get_problems(data.get("presentation"))
             self._handle_presentation_change(data)
         elif op == "newdanmu" and self.config["auto_danmu"]:
             current_content = data["danmu"].lower()
             uid = data["userid"]
-            sent_danmu_user = User(uid)
-            if sent_danmu_user in self.classmates_ls:
-                for i in self.classmates_ls:
-                    if i == sent_danmu_user:
-                        meg = "%s课程的%s%s发送了弹幕：%s" %(self.lessonname,i.sno,i.name,data["danmu"])
-                        self.add_message(meg,2)
-                        break
-            else:
-                self.classmates_ls.append(sent_danmu_user)
-                sent_danmu_user.get_userinfo(self.classroomid,self.headers)
-                meg = "%s课程的%s%s发送了弹幕：%s" %(self.lessonname,sent_danmu_user.sno,sent_danmu_user.name,data["danmu"])
-                self.add_message(meg,2)
-            now = time.time()
-            # 收到一条弹幕，尝试取出其之前的所有记录的列表，取不到则初始化该内容列表
-            try:
-                same_content_ls = self.danmu_dict[current_content]
-            except KeyError:
-                self.danmu_dict[current_content] = []
-                same_content_ls = self.danmu_dict[current_content]
-            # 清除超过60秒的弹幕记录
-            for i in same_content_ls:
-                if now - i > 60:
-                    same_content_ls.remove(i)
+            danmu = data["danmu"]
+            # 未知同学的信息在后台获取，获取完成后作为该课程的消息重新入队输出
+            user = self.classmates.lookup(uid, self.headers, lambda user: self.dispatcher.submit(self.key, self._show_danmu, user, danmu))
+            if user is not None:
+                self._show_danmu(user, danmu)
+            now = time.monotonic()
             # 如果当前的弹幕没被发过，或者已发送时间超过60秒
-            if current_content not in self.sent_danmu_dict.keys() or now - self.sent_danmu_dict[current_content] > 60:
-                if len(same_content_ls) + 1 >= self.config["danmu_config"]["danmu_limit"]:
+            if not self.danmu_window.sent_recently(current_content, now):
+                # 60秒内相同内容的弹幕数（含本条）达到阈值则跟风发送
+                if self.danmu_window.count(current_content, now) + 1 >= self.config["danmu_config"]["danmu_limit"]:
                     self.send_danmu(current_content)
-                    same_content_ls = []
-                    self.sent_danmu_dict[current_content] = now
+                    self.danmu_window.reset(current_content)
+                    self.danmu_window.mark_sent(current_content, now)
                 else:
-                    same_content_ls.append(now)
+                    self.danmu_window.add(current_content, now)
         elif op == "callpaused":
             meg = "%s点名了，点到了：%s" % (self.lessonname, data["name"])
             if self.user_uname == data["name"]:
@@ -310,30 +578,61 @@ class Lesson:
             problem_id = self._resolve_problem_id(data)
             self._notify_problem_release(problem_id, time_left)
 
+    def _show_danmu(self, user, danmu):
+        if user.name is None:
+            meg = "%s课程的%s发送了弹幕：%s" %(self.lessonname,user.uid,danmu)
+        else:
+            meg = "%s课程的%s%s发送了弹幕：%s" %(self.lessonname,user.sno,user.name,danmu)
+        self.add_message(meg,2)
+
     def _current_problem(self, wsapp, promblemid):
         # 为获取已解锁的问题详情信息，向wsapp发送probleminfo
         query_problem = {"op":"probleminfo","lessonid":self.lessonid,"problemid":promblemid,"msgid":1}
         wsapp.send(json.dumps(query_problem))
     
-    def start_lesson(self, callback):
+    def prepare_lesson(self):
+        # 签到并获取课程信息，加入监听列表（线程模式与asyncio模式共用）
+        self.ready_started = time.monotonic()
         self.auth = self.checkin_class()
         rtn = self.get_lesson_info()
         teacher = rtn["teacher"]["name"]
         title = rtn["title"]
         timestamp = rtn["startTime"] // 1000
         time_str = time.strftime("%Y-%m-%d %H:%M:%S",time.localtime(timestamp))
-        index = self.main_ui.tableWidget.rowCount()
-        self.add_course([self.lessonname,title,teacher,time_str],index)
-        self.wsapp = websocket.WebSocketApp(url=wss_url,header=self.headers,on_open=self.on_open,on_message=self.on_message)
-        self.wsapp.run_forever()
+        self.timetable.record_start(self.lessonid, self.classroomid, self.lessonname, timestamp, self.sink.account)
+        self.add_course([self.lessonname,title,teacher,time_str],self.key,self.stats)
+        self.watchdog.watch(self)
+
+    def finish_lesson(self):
+        # 监听结束，等待已收到的消息处理完毕后从监听列表中移除
+        self.watchdog.unwatch(self)
+        self.dispatcher.wait_idle(self.key, timeout=10)
+        if not self.migrating:
+            self.timetable.record_end(self.lessonid)
         meg = "%s监听结束" % self.lessonname
         self.add_message(meg,7)
-        self.del_course(index)
+        self.del_course(self.key)
+
+    def start_lesson(self, callback):
+        try:
+            self.prepare_lesson()
+        except Exception as e:
+            # 签到失败时移出监听列表，下次轮询时重新尝试
+            self.add_message("%s加入监听失败：%s" % (self.lessonname, e),7)
+            return callback(self)
+        while True:
+            self.wsapp = websocket.WebSocketApp(url=Http.WSS_URL,header=self.ws_headers,on_open=self.on_open,on_message=self.on_message,on_pong=self.on_pong)
+            self.wsapp.run_forever(ping_interval=self.ping_interval,ping_timeout=self.ping_timeout or None)
+            # 意外断线时沿用签到结果重连，停止监听时立即结束等待
+            delay = self.next_reconnect_delay()
+            if delay is None or not self.sink.wait(delay):
+                break
+        self.finish_lesson()
         # threading.Thread(target=say_something,args=(meg,)).start()
         return callback(self)
     
     def send_danmu(self,content):
-        url = "https://changjiang.yuketang.cn/api/v3/lesson/danmu/send"
+        url = Http.api_url("/api/v3/lesson/danmu/send")
         data = {
             "extra": "",
             "fromStart": "50",
@@ -345,28 +644,18 @@ class Lesson:
             "userName": "",
             "wordCloud": True
         }
-        r = requests.post(url=url,headers=self.headers,data=json.dumps(data),proxies={"http": None,"https":None})
-        if dict_result(r.text)["code"] == 0:
+        r = Http.post(url=url,headers=self.headers,data=json.dumps(data))
+        if dict_result(r.content)["code"] == 0:
             meg = "%s弹幕发送成功！内容：%s" % (self.lessonname,content)
         else:
             meg = "%s弹幕发送失败！内容：%s" % (self.lessonname,content)
         self.add_message(meg,1)
     
     def get_lesson_info(self):
-        url = "https://changjiang.yuketang.cn/api/v3/lesson/basic-info"
-        r = requests.get(url=url,headers=self.headers,proxies={"http": None,"https":None})
-        return dict_result(r.text)["data"]
+        url = Http.api_url("/api/v3/lesson/basic-info")
+        r = Http.get(url=url,headers=self.headers)
+        return dict_result(r.content)["data"]
         
 
     def __eq__(self, other):
         return self.lessonid == other.lessonid
-
-class User:
-    def __init__(self, uid):
-        self.uid = uid
-    
-    def get_userinfo(self, classroomid, headers):
-        r = requests.get("https://changjiang.yuketang.cn/v/course_meta/fetch_user_info_new?query_user_id=%s&classroom_id=%s" % (self.uid,classroomid),headers=headers,proxies={"http": None,"https":None})
-        data = dict_result(r.text)["data"]
-        self.sno = data["school_number"]
-        self.name = data["name"]
\ No newline at end of file
@@ -0,0 +1,42 @@
+import json
+
+# JSON解码后端：安装了orjson或msgspec时优先使用，否则使用标准库json
+# 配置项json_backend可指定 auto / orjson / msgspec / json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+def _available_backends():
+    backends = {"json": json.loads}
+    if msgspec is not None:
+        backends["msgspec"] = msgspec.json.Decoder().decode
+    if orjson is not None:
+        backends["orjson"] = orjson.loads
+    return backends
+
+BACKENDS = _available_backends()
+# auto时的优先顺序
+PREFERRED = ("orjson", "msgspec", "json")
+
+backend = next(name for name in PREFERRED if name in BACKENDS)
+loads = BACKENDS[backend]
+
+def set_backend(name):
+    # 切换解码后端，不可用时保持auto的选择，返回实际使用的后端
+    global backend, loads
+    if name not in BACKENDS:
+        name = next(name for name in PREFERRED if name in BACKENDS)
+    backend = name
+    loads = BACKENDS[name]
+    return backend
+
+def decode(data):
+    # 解码str或bytes，REST响应可直接传入r.content，省去文本解码
+    return loads(data)
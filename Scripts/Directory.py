@@ -0,0 +1,146 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Scripts import Http
+from Scripts.Utils import dict_result, get_cache_dir
+
+# 同班同学信息目录：按班级保存 uid -> 学号、姓名，跨课程、跨会话共享并持久化到本地，
+# 未知用户的信息在后台线程获取，不阻塞websocket消息处理
+
+FETCH_WORKERS = 4
+SAVE_DELAY = 5
+
+_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="classmate")
+
+class User:
+    __slots__ = ("uid", "sno", "name")
+
+    def __init__(self, uid, sno=None, name=None):
+        self.uid = uid
+        self.sno = sno
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, User) and self.uid == other.uid
+
+    def __hash__(self):
+        return hash(self.uid)
+
+    def get_userinfo(self, classroomid, headers):
+        r = Http.get(Http.api_url("/v/course_meta/fetch_user_info_new?query_user_id=%s&classroom_id=%s" % (self.uid,classroomid)),headers=headers)
+        data = dict_result(r.content)["data"]
+        self.sno = data["school_number"]
+        self.name = data["name"]
+
+class ClassmateDirectory:
+    def __init__(self, classroomid, path):
+        self.classroomid = classroomid
+        self.path = path
+        self.lock = threading.Lock()
+        # uid -> User
+        self.users = {}
+        # 正在获取的uid -> 等待结果的回调列表
+        self.pending = {}
+        # 尚未完成回调的后台获取数
+        self.fetching = 0
+        self.idle = threading.Condition(self.lock)
+        self.load_started = False
+        self.save_timer = None
+
+    def _load(self):
+        # 读取本地保存的同学信息
+        try:
+            with open(self.path,"r",encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        with self.lock:
+            for uid, (sno, name) in data.items():
+                self.users.setdefault(uid, User(uid, sno, name))
+
+    def _save(self):
+        with self.lock:
+            self.save_timer = None
+            data = {uid: [user.sno, user.name] for uid, user in self.users.items()}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(tmp_path,"w",encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _schedule_save(self):
+        # 合并短时间内的多次写入
+        with self.lock:
+            if self.save_timer is not None:
+                return
+            self.save_timer = threading.Timer(SAVE_DELAY, self._save)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def prefetch(self):
+        # 后台载入本地保存的目录（收到hello时调用）
+        with self.lock:
+            if self.load_started:
+                return
+            self.load_started = True
+        _executor.submit(self._load)
+
+    def lookup(self, uid, headers, callback):
+        '''
+        查询同学信息
+        已知同学直接返回User，不调用callback；未知同学返回None，在后台获取后调用callback(user)，
+        同一uid只发出一次请求。callback在classmate线程中执行，调用方需自行转回所需的线程或顺序
+        获取失败时user.sno与user.name为None
+        '''
+        uid = str(uid)
+        user = self.users.get(uid)
+        if user is not None:
+            return user
+        with self.lock:
+            if uid in self.pending:
+                self.pending[uid].append(callback)
+                return None
+            self.pending[uid] = [callback]
+            self.fetching += 1
+        _executor.submit(self._fetch, uid, headers)
+        return None
+
+    def wait_pending(self, timeout=None):
+        # 等待后台获取全部完成并已调用回调（回放时用于确定输出）
+        with self.idle:
+            return self.idle.wait_for(lambda: self.fetching == 0, timeout)
+
+    def _fetch(self, uid, headers):
+        user = User(uid)
+        try:
+            user.get_userinfo(self.classroomid, headers)
+        except Exception:
+            pass
+        with self.lock:
+            callbacks = self.pending.pop(uid, [])
+            if user.name is not None:
+                self.users[uid] = user
+        if user.name is not None:
+            self._schedule_save()
+        try:
+            for callback in callbacks:
+                callback(user)
+        finally:
+            with self.idle:
+                self.fetching -= 1
+                self.idle.notify_all()
+
+_directories = {}
+_directories_lock = threading.Lock()
+
+def get_directory(classroomid, config):
+    # 获取班级的同学目录，同一班级在进程内只有一份
+    classroomid = str(classroomid)
+    with _directories_lock:
+        directory = _directories.get(classroomid)
+        if directory is None:
+            path = os.path.join(get_cache_dir(config), "classmates", "%s.json" % classroomid)
+            directory = ClassmateDirectory(classroomid, path)
+            _directories[classroomid] = directory
+        return directory
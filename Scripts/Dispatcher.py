@@ -0,0 +1,120 @@
+import time
+import threading
+from collections import deque
+
+# websocket消息分发池
+# socket回调线程只负责解析并入队，消息由有界的工作线程池处理（可能包含阻塞的HTTP请求）。
+# 同一课程（key）的消息同一时刻只由一个工作线程处理，保证按到达顺序执行；不同课程之间并行。
+
+DEFAULT_WORKERS = 8
+# 单个课程排队消息的上限，超出后可丢弃的消息（如他人弹幕）直接丢弃
+DEFAULT_MAX_PENDING = 1000
+
+class Dispatcher:
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        # 工作线程等待新任务；wait_idle等待某个key处理完毕，两者分开避免互相抢占唤醒
+        self.work_cond = threading.Condition(self.lock)
+        self.idle_cond = threading.Condition(self.lock)
+        # key -> 待处理任务队列
+        self.queues = {}
+        # 有待处理任务且未被处理中的key
+        self.ready = deque()
+        # 正在被处理的key
+        self.running = set()
+        self.queued = 0
+        self.max_queued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name="dispatch-%d" % i, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, key, func, *args, droppable=False):
+        # 提交任务，返回是否入队成功
+        with self.lock:
+            queue = self.queues.get(key)
+            if queue is None:
+                queue = self.queues[key] = deque()
+            if droppable and len(queue) >= self.max_pending:
+                self.dropped += 1
+                return False
+            queue.append((func, args, time.monotonic()))
+            self.queued += 1
+            if self.queued > self.max_queued:
+                self.max_queued = self.queued
+            if len(queue) == 1 and key not in self.running:
+                self.ready.append(key)
+                self.work_cond.notify()
+        return True
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                while not self.ready:
+                    self.work_cond.wait()
+                key = self.ready.popleft()
+                self.running.add(key)
+                func, args, _ = self.queues[key].popleft()
+                self.queued -= 1
+            failed = False
+            try:
+                func(*args)
+            except Exception:
+                failed = True
+            with self.lock:
+                self.processed += 1
+                if failed:
+                    self.errors += 1
+                self.running.discard(key)
+                queue = self.queues[key]
+                if queue:
+                    self.ready.append(key)
+                    self.work_cond.notify()
+                else:
+                    del self.queues[key]
+                    self.idle_cond.notify_all()
+
+    def wait_idle(self, key, timeout=None):
+        # 等待某个key的全部任务处理完毕
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            while key in self.queues or key in self.running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.idle_cond.wait(remaining)
+        return True
+
+    def stats(self):
+        # 队列深度等统计信息
+        with self.lock:
+            oldest = min((queue[0][2] for queue in self.queues.values() if queue), default=None)
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "busy": len(self.running),
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "oldest_wait": 0 if oldest is None else time.monotonic() - oldest,
+                "depth": {key: len(queue) for key, queue in self.queues.items()},
+            }
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher(config):
+    # 进程内共享的分发池，工作线程数由配置项dispatch_workers指定
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = Dispatcher(int(config.get("dispatch_workers", DEFAULT_WORKERS)))
+    return _dispatcher
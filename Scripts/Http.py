@@ -0,0 +1,160 @@
+import time
+import threading
+import http.cookiejar
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from Scripts import Metrics
+
+# 进程内共享的HTTP客户端，所有雨课堂REST请求都经由这里发出，复用keep-alive连接
+
+# 接口地址，可由配置项api_base、wss_url修改（例如指向本地的Scripts.MockServer）
+DEFAULT_API_BASE = "https://changjiang.yuketang.cn"
+DEFAULT_WSS_URL = "wss://changjiang.yuketang.cn/wsapp/"
+API_BASE = DEFAULT_API_BASE
+WSS_URL = DEFAULT_WSS_URL
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0"
+# 与原有实现保持一致：不走系统代理
+NO_PROXIES = {"http": None, "https": None}
+
+# 连接池参数：缓存的host数量、每个host保留的keep-alive连接数
+POOL_CONNECTIONS = 4
+# 不是并发上限：连接池不阻塞（pool_block为False），并发请求超过该数时临时建立新连接，用完后关闭而不放回池中。
+# 课程开始时大量同学信息请求同时发出，阻塞等待空闲连接会使签到与hello排在其后
+POOL_KEEPALIVE = 32
+# 重试参数：仅对连接错误及网关类状态码重试，退避 0.3s, 0.6s, 1.2s ...
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUS = (502, 503, 504)
+DEFAULT_TIMEOUT = 10
+
+# 响应回调 hook(method, url, response)，用于会话录制等
+response_hooks = []
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "new_connections": 0,
+}
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+class _CountingHTTPConnection(HTTPConnection):
+    # 统计实际建立的TCP(+TLS)连接数，用于计算连接复用情况
+    def connect(self):
+        _count("new_connections")
+        return super().connect()
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _count("new_connections")
+        return super().connect()
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+def _build_session():
+    # 构造全局Session，默认请求头只构造一次
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT})
+    # 不在Session中保存响应cookie，身份完全由每次请求的Cookie头决定（多个sessionid共用一个Session）
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    retry = Retry(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=RETRY_TOTAL,
+        status=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+        raise_on_status=False,
+    )
+    adapter = _PooledAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_KEEPALIVE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    # 获取进程内唯一的Session
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def auth_headers(sessionid):
+    # 按sessionid生成请求头，User-Agent由Session统一提供
+    return {"Cookie": "sessionid=%s" % sessionid}
+
+def set_base_urls(api_base=None, wss_url=None):
+    # 设置接口地址，传入空值时恢复默认
+    global API_BASE, WSS_URL
+    API_BASE = (api_base or DEFAULT_API_BASE).rstrip("/")
+    WSS_URL = wss_url or DEFAULT_WSS_URL
+
+def api_url(path):
+    # 拼接雨课堂接口地址
+    return API_BASE + path
+
+def request(method, url, headers=None, **kwargs):
+    # 经由共享连接池发出请求
+    kwargs.setdefault("proxies", NO_PROXIES)
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    _count("requests")
+    if Metrics.enabled:
+        # 按接口路径（不含参数）统计请求数与耗时
+        endpoint = urlsplit(url).path
+        start = time.perf_counter()
+        try:
+            response = get_session().request(method, url, headers=headers, **kwargs)
+        except Exception:
+            Metrics.HTTP_REQUESTS.inc(endpoint, "error")
+            raise
+        Metrics.HTTP_SECONDS.observe(time.perf_counter() - start, endpoint)
+        Metrics.HTTP_REQUESTS.inc(endpoint, str(response.status_code))
+    else:
+        response = get_session().request(method, url, headers=headers, **kwargs)
+    for hook in response_hooks:
+        hook(method, url, response)
+    return response
+
+def get(url, headers=None, **kwargs):
+    return request("GET", url, headers=headers, **kwargs)
+
+def post(url, headers=None, **kwargs):
+    return request("POST", url, headers=headers, **kwargs)
+
+def get_stats():
+    # 连接复用统计：复用连接数 = 请求数 - 新建连接数
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["reused_connections"] = max(stats["requests"] - stats["new_connections"], 0)
+    return stats
+
+def close():
+    # 关闭全部连接，下次请求时重新建立
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 运行指标：计数器与固定分桶的直方图，记录REST请求、websocket消息处理、上课列表轮询、签到与重连，
+# 可通过本地HTTP接口以Prometheus文本格式（/metrics）或JSON（/metrics.json）读取，也可定期写入JSON快照。
+# 未配置metrics_port与metrics_snapshot_path时不记录，各埋点只有一次全局变量判断的开销。
+
+PREFIX = "rainclassroom_"
+# 耗时直方图的分桶上界（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DEFAULT_SNAPSHOT_INTERVAL = 60
+
+enabled = False
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        # 标签值元组 -> 计数
+        self.values = {}
+
+    def inc(self, *labels, value=1):
+        if not enabled:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def dump(self):
+        with self.lock:
+            return dict(self.values)
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # 标签值元组 -> [各分桶计数（不累计，最后一个为+Inf）..., 总和, 次数]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        if not enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * (len(self.buckets) + 3)
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def dump(self):
+        with self.lock:
+            return {labels: list(entry) for labels, entry in self.values.items()}
+
+    def quantile(self, entry, q):
+        # 由分桶估计分位数，返回所在分桶的上界；落在最后一个分桶之外时返回最大的上界（JSON中不能出现Infinity）
+        target = entry[-1] * q
+        total = 0
+        for index, bound in enumerate(self.buckets):
+            total += entry[index]
+            if total >= target:
+                return bound
+        return self.buckets[-1]
+
+HTTP_REQUESTS = Counter("http_requests_total", "REST请求数", ("endpoint", "status"))
+HTTP_SECONDS = Histogram("http_request_seconds", "REST请求耗时", ("endpoint",))
+MESSAGE_SECONDS = Histogram("lesson_message_seconds", "websocket消息从收到到处理完毕的耗时（含排队）", ("op",))
+HANDLE_SECONDS = Histogram("lesson_handle_seconds", "websocket消息的处理耗时（不含排队）", ("op",))
+DISCOVERY_SECONDS = Histogram("discovery_poll_seconds", "一次上课列表轮询的耗时")
+LESSONS_DISCOVERED = Counter("lessons_discovered_total", "检测到的新课程数")
+CHECKIN_SECONDS = Histogram("checkin_seconds", "签到耗时（含重试）", buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15))
+CHECKIN_ATTEMPTS = Counter("checkin_attempts_total", "签到请求数", ("result",))
+RECONNECTS = Counter("ws_reconnects_total", "websocket重连次数", ("reason",))
+
+METRICS = [HTTP_REQUESTS, HTTP_SECONDS, MESSAGE_SECONDS, HANDLE_SECONDS, DISCOVERY_SECONDS,
+           LESSONS_DISCOVERED, CHECKIN_SECONDS, CHECKIN_ATTEMPTS, RECONNECTS]
+
+# 其他进程（Supervisor工作进程）上报的指标：来源 -> dump()
+_remote = {}
+_remote_lock = threading.Lock()
+_config = {}
+_server = None
+_snapshot_thread = None
+_start_lock = threading.Lock()
+
+def dump():
+    # 本进程的全部指标，可经由multiprocessing队列传递
+    return {metric.name: metric.dump() for metric in METRICS}
+
+def set_remote(source, data):
+    with _remote_lock:
+        _remote[source] = data
+
+def _merged():
+    # 本进程与其他进程的指标相加
+    result = dump()
+    with _remote_lock:
+        remotes = list(_remote.values())
+    for data in remotes:
+        for name, values in data.items():
+            merged = result.setdefault(name, {})
+            for labels, value in values.items():
+                if labels not in merged:
+                    merged[labels] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    merged[labels] = [a + b for a, b in zip(merged[labels], value)]
+                else:
+                    merged[labels] += value
+    return result
+
+def _components():
+    # 各模块已有的统计，作为gauge导出：{模块: {名称: 数值}}
+    from Scripts import Http
+    from Scripts.Dispatcher import get_dispatcher
+    from Scripts.Cache import get_ppt_cache
+    from Scripts.Watchdog import get_watchdog
+    from Scripts.Speech import get_speaker
+    components = {
+        "http": Http.get_stats(),
+        "dispatcher": get_dispatcher(_config).stats(),
+        "watchdog": get_watchdog().stats(),
+        "speaker": dict(get_speaker().stats),
+    }
+    cache = get_ppt_cache(_config)
+    if cache is not None:
+        components["ppt_cache"] = cache.stats()
+    return {component: {key: value for key, value in stats.items() if isinstance(value, (int, float))}
+            for component, stats in components.items()}
+
+def _format_labels(names, values, extra=None):
+    pairs = ['%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in zip(names, values)]
+    if extra:
+        pairs.append('%s="%s"' % extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+def prometheus_text():
+    # Prometheus文本格式
+    data = _merged()
+    lines = []
+    for metric in METRICS:
+        name = PREFIX + metric.name
+        values = data.get(metric.name, {})
+        lines.append("# HELP %s %s" % (name, metric.help))
+        if isinstance(metric, Counter):
+            lines.append("# TYPE %s counter" % name)
+            for labels, value in sorted(values.items()):
+                lines.append("%s%s %s" % (name, _format_labels(metric.labelnames, labels), value))
+            continue
+        lines.append("# TYPE %s histogram" % name)
+        for labels, entry in sorted(values.items()):
+            total = 0
+            for index, bound in enumerate(metric.buckets):
+                total += entry[index]
+                lines.append("%s_bucket%s %d" % (name, _format_labels(metric.labelnames, labels, ("le", bound)), total))
+            lines.append("%s_bucket%s %d" % (name, _format_labels(metric.labelnames, labels, ("le", "+Inf")), entry[-1]))
+            lines.append("%s_sum%s %s" % (name, _format_labels(metric.labelnames, labels), entry[-2]))
+            lines.append("%s_count%s %d" % (name, _format_labels(metric.labelnames, labels), entry[-1]))
+    for component, stats in _components().items():
+        for key, value in sorted(stats.items()):
+            name = "%s%s_%s" % (PREFIX, component, key)
+            lines.append("# TYPE %s gauge" % name)
+            lines.append("%s %s" % (name, value))
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    # JSON快照：计数器取值，直方图给出次数、平均值与估计的分位数（毫秒）
+    data = _merged()
+    result = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "counters": {}, "histograms": {}, "components": _components()}
+    for metric in METRICS:
+        values = data.get(metric.name, {})
+        if isinstance(metric, Counter):
+            result["counters"][metric.name] = [dict(labels=dict(zip(metric.labelnames, labels)), value=value) for labels, value in sorted(values.items())]
+            continue
+        rows = []
+        for labels, entry in sorted(values.items()):
+            count = entry[-1]
+            rows.append({
+                "labels": dict(zip(metric.labelnames, labels)),
+                "count": count,
+                "avg_ms": round(entry[-2] / count * 1000, 2) if count else 0,
+                "p50_ms": metric.quantile(entry, 0.5) * 1000,
+                "p95_ms": metric.quantile(entry, 0.95) * 1000,
+                "p99_ms": metric.quantile(entry, 0.99) * 1000,
+            })
+        result["histograms"][metric.name] = rows
+    return result
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = prometheus_text().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(snapshot(), ensure_ascii=False, allow_nan=False, default=str).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _write_snapshots(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = "%s.%d.tmp" % (path, os.getpid())
+            with open(tmp_path,"w",encoding="utf-8") as f:
+                json.dump(snapshot(), f, ensure_ascii=False, allow_nan=False, default=str)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+def configure(config, serve=True):
+    '''
+    按配置启用指标
+    metrics_port: 本地HTTP接口端口，0为不开启
+    metrics_snapshot_path: 定期写入JSON快照的文件，留空为不写入
+    serve: 为False时只记录不开启接口（Supervisor工作进程的指标由主进程汇总导出）
+    '''
+    global enabled, _config, _server, _snapshot_thread
+    port = int(config.get("metrics_port", 0) or 0)
+    path = config.get("metrics_snapshot_path") or ""
+    _config = config
+    enabled = bool(port or path)
+    if not serve:
+        return
+    with _start_lock:
+        if port and _server is None:
+            _server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        if path and _snapshot_thread is None:
+            interval = config.get("metrics_snapshot_interval", DEFAULT_SNAPSHOT_INTERVAL)
+            _snapshot_thread = threading.Thread(target=_write_snapshots, args=(path, interval), name="metrics-snapshot", daemon=True)
+            _snapshot_thread.start()
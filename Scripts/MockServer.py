@@ -0,0 +1,363 @@
+import sys
+import json
+import time
+import base64
+import random
+import struct
+import asyncio
+import hashlib
+import argparse
+from urllib.parse import urlsplit, parse_qs
+
+# 本地模拟的雨课堂服务，用于压测monitor/Lesson（仅依赖标准库）
+# 实现 on-lesson、basic-info、checkin、presentation/fetch、danmu/send、fetch_user_info_new 接口
+# 及 /wsapp/ 的 hello、probleminfo 等websocket消息，可模拟N个同时上课的课程和可配置的事件频率。
+#
+# 用法：python -m Scripts.MockServer --lessons 50 --danmu-rate 5 --port 8000
+# 客户端配置：{"api_base": "http://127.0.0.1:8000", "wss_url": "ws://127.0.0.1:8000/wsapp/"}
+#
+# 延迟探测：每隔probe_interval秒向每个课程连续发送danmu_limit条相同的探测弹幕，
+# 客户端跟风发送（danmu/send）到达时即可得到一次从推送到处理完成的端到端延迟。
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+class MockLesson:
+    def __init__(self, index, slides, problem_every, decks=1):
+        self.index = index
+        self.lessonid = "mock-lesson-%d" % index
+        self.classroomid = "mock-classroom-%d" % index
+        self.presentationid = "mock-ppt-%d" % index
+        self.start_time = int(time.time() * 1000)
+        self.slides = slides
+        self.problem_every = problem_every
+        self.version = 0
+        self.sockets = set()
+        # hello中返回的timeline与已解锁题目，随事件推送累积
+        # 本节课此前放映过的其他PPT，hello时需要一并获取
+        self.presentations = ["%s-%d" % (self.presentationid, i) for i in range(1, decks)] + [self.presentationid]
+        self.timeline = [{"type": "slide", "pres": presentationid, "si": 0} for presentationid in self.presentations]
+        self.unlocked = []
+        self.page = 0
+
+    def presentation(self, presentationid):
+        # 生成PPT数据，version变化时题目内容随之变化
+        data = []
+        for i in range(self.slides):
+            slide = {"id": "%s-%d" % (presentationid, i), "index": i, "cover": "", "shapes": []}
+            if self.problem_every and i % self.problem_every == 0:
+                slide["problem"] = {"problemId": "%s-p%d" % (presentationid, i), "problemType": 1, "content": "题目%d v%d" % (i, self.version), "answers": ["A"]}
+            data.append(slide)
+        return {"title": "模拟课件", "slides": data}
+
+class MockServer:
+    def __init__(self, lessons=10, danmu_rate=1.0, slide_rate=0.1, problem_interval=60, call_interval=120,
+                 probe_interval=10, danmu_limit=5, slides=100, problem_every=10, users=200, user_delay=0.0,
+                 checkin_fail_rate=0.0, drop_interval=0, stall=False, decks=1, ppt_delay=0.0):
+        self.lessons = {}
+        for i in range(lessons):
+            lesson = MockLesson(i, slides, problem_every, decks)
+            self.lessons[lesson.lessonid] = lesson
+        self.danmu_rate = danmu_rate
+        self.slide_rate = slide_rate
+        self.problem_interval = problem_interval
+        self.call_interval = call_interval
+        self.probe_interval = probe_interval
+        self.danmu_limit = danmu_limit
+        self.users = users
+        self.user_delay = user_delay
+        self.checkin_fail_rate = checkin_fail_rate
+        self.drop_interval = drop_interval
+        self.stall = stall
+        self.ppt_delay = ppt_delay
+        # 模拟半开的连接
+        self.stalled = set()
+        # 探测弹幕内容 -> 最后一条的发送时间
+        self.probes = {}
+        self.probe_seq = 0
+        self.latencies = []
+        self.stats = {"rest": 0, "frames_sent": 0, "frames_received": 0, "danmu_send": 0, "sockets": 0, "checkin_failed": 0, "dropped": 0, "not_modified": 0}
+
+    # ---------- REST ----------
+
+    def rest(self, method, path, query, body, headers=None):
+        # 返回 (状态码, 额外响应头, JSON对象)，JSON对象为None时响应体为空
+        self.stats["rest"] += 1
+        if path == "/api/v3/user/basic-info":
+            return 200, {}, {"code": 0, "data": {"id": 1, "name": "压测用户"}}
+        if path == "/api/v3/classroom/on-lesson":
+            classrooms = [{"lessonId": l.lessonid, "courseName": "模拟课程%d" % l.index, "classroomId": l.classroomid} for l in self.lessons.values()]
+            return 200, {}, {"code": 0, "data": {"onLessonClassrooms": classrooms}}
+        if path == "/api/v3/lesson/checkin" and method == "POST":
+            data = json.loads(body or b"{}")
+            lessonid = data.get("lessonId")
+            # 模拟签到失败：不返回Set-Auth
+            if random.random() < self.checkin_fail_rate:
+                self.stats["checkin_failed"] += 1
+                return 200, {}, {"code": 0, "data": {}}
+            return 200, {"Set-Auth": "mock-auth-%s" % lessonid}, {"code": 0, "data": {"lessonToken": "mock-token-%s" % lessonid}}
+        if path == "/api/v3/lesson/basic-info":
+            return 200, {}, {"code": 0, "data": {"teacher": {"name": "模拟教师"}, "title": "压测课堂", "startTime": int(time.time() * 1000)}}
+        if path == "/api/v3/lesson/presentation/fetch":
+            presentationid = query.get("presentation_id", [""])[0]
+            for lesson in self.lessons.values():
+                if presentationid in lesson.presentations:
+                    etag = '"%s-%d"' % (presentationid, lesson.version)
+                    # 与客户端缓存的ETag一致时返回304，验证PPT缓存的条件请求
+                    if (headers or {}).get("if-none-match") == etag:
+                        self.stats["not_modified"] += 1
+                        return 304, {"ETag": etag}, None
+                    return 200, {"ETag": etag}, {"code": 0, "data": lesson.presentation(presentationid)}
+            return 404, {}, {"code": 404, "data": {}}
+        if path == "/api/v3/lesson/danmu/send" and method == "POST":
+            self.stats["danmu_send"] += 1
+            data = json.loads(body or b"{}")
+            sent = self.probes.pop(data.get("message"), None)
+            if sent is not None:
+                self.latencies.append(time.monotonic() - sent)
+            return 200, {}, {"code": 0, "data": {}}
+        if path == "/v/course_meta/fetch_user_info_new":
+            uid = query.get("query_user_id", ["0"])[0]
+            return 200, {}, {"code": 0, "data": {"school_number": "S%s" % uid, "name": "同学%s" % uid}}
+        return 404, {}, {"code": 404, "data": {}}
+
+    # ---------- websocket ----------
+
+    async def ws_send(self, writer, text):
+        payload = text.encode("utf-8")
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | OP_TEXT, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | OP_TEXT, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | OP_TEXT, 127, length)
+        writer.write(header + payload)
+        self.stats["frames_sent"] += 1
+        await writer.drain()
+
+    async def ws_read(self, reader):
+        # 读取一个完整的客户端帧，返回 (opcode, payload)
+        first, second = await reader.readexactly(2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    async def websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            "Sec-WebSocket-Accept: %s\r\n\r\n" % accept).encode())
+        await writer.drain()
+        self.stats["sockets"] += 1
+        events = None
+        lesson = None
+        try:
+            while True:
+                opcode, payload = await self.ws_read(reader)
+                if writer in self.stalled:
+                    continue
+                if opcode == OP_CLOSE:
+                    writer.write(struct.pack("!BB", 0x80 | OP_CLOSE, 0))
+                    break
+                if opcode == OP_PING:
+                    writer.write(struct.pack("!BB", 0x80 | OP_PONG, len(payload)) + payload)
+                    continue
+                if opcode != OP_TEXT:
+                    continue
+                self.stats["frames_received"] += 1
+                data = json.loads(payload)
+                op = data.get("op")
+                if op == "hello":
+                    lesson = self.lessons.get(data.get("lessonid"))
+                    if lesson is None:
+                        continue
+                    lesson.sockets.add(writer)
+                    await self.ws_send(writer, json.dumps({
+                        "op": "hello", "presentation": lesson.presentationid,
+                        "timeline": lesson.timeline,
+                        "unlockedproblem": lesson.unlocked,
+                    }))
+                    if events is None:
+                        events = asyncio.create_task(self.lesson_events(lesson, writer))
+                elif op == "probleminfo":
+                    await self.ws_send(writer, json.dumps({
+                        "op": "probleminfo", "problemid": data.get("problemid"), "limit": 60,
+                        "now": int(time.time() * 1000), "dt": int(time.time() * 1000),
+                    }))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if events is not None:
+                events.cancel()
+            if lesson is not None:
+                lesson.sockets.discard(writer)
+            self.stalled.discard(writer)
+            self.stats["sockets"] -= 1
+            writer.close()
+
+    async def lesson_events(self, lesson, writer):
+        # 按配置的频率推送弹幕、翻页、发题、点名与探测弹幕
+        loop = asyncio.get_running_loop()
+        rng = random.Random(lesson.index)
+        next_probe = loop.time() + self.probe_interval
+        next_problem = loop.time() + self.problem_interval
+        next_call = loop.time() + self.call_interval
+        tick = 0.05
+        danmu_credit = 0.0
+        slide_credit = 0.0
+        # 模拟断线：连接保持drop_interval秒后被服务端直接断开
+        drop_at = loop.time() + self.drop_interval if self.drop_interval else None
+        try:
+            while True:
+                await asyncio.sleep(tick)
+                now = loop.time()
+                if drop_at is not None and now >= drop_at:
+                    self.stats["dropped"] += 1
+                    if self.stall:
+                        # 模拟半开连接：不关闭连接，但不再推送消息、不再响应ping
+                        self.stalled.add(writer)
+                    else:
+                        writer.transport.abort()
+                    return
+                danmu_credit += self.danmu_rate * tick
+                while danmu_credit >= 1:
+                    danmu_credit -= 1
+                    await self.ws_send(writer, json.dumps({
+                        "op": "newdanmu", "danmu": "弹幕%d" % rng.randint(0, 1000000),
+                        "userid": rng.randint(1, self.users), "sid": "x",
+                    }, ensure_ascii=False))
+                slide_credit += self.slide_rate * tick
+                while slide_credit >= 1:
+                    slide_credit -= 1
+                    lesson.page += 1
+                    # 每翻20页修改一次题目内容，覆盖增量更新路径
+                    if lesson.page % 20 == 0:
+                        lesson.version += 1
+                    lesson.timeline.append({"type": "slide", "pres": lesson.presentationid, "si": lesson.page % lesson.slides})
+                    await self.ws_send(writer, json.dumps({"op": "presentationupdated", "presentation": lesson.presentationid, "slide": {"index": lesson.page % lesson.slides}}))
+                if self.problem_interval and now >= next_problem:
+                    next_problem = now + self.problem_interval
+                    problem_page = (lesson.page % lesson.slides // lesson.problem_every * lesson.problem_every) if lesson.problem_every else 0
+                    problem_id = "%s-p%d" % (lesson.presentationid, problem_page)
+                    if problem_id not in lesson.unlocked:
+                        lesson.unlocked.append(problem_id)
+                    await self.ws_send(writer, json.dumps({"op": "unlockproblem", "problem": {"sid": problem_id, "limit": 60}}))
+                if self.call_interval and now >= next_call:
+                    next_call = now + self.call_interval
+                    await self.ws_send(writer, json.dumps({"op": "callpaused", "name": "同学%d" % rng.randint(1, self.users)}, ensure_ascii=False))
+                if self.probe_interval and now >= next_probe:
+                    next_probe = now + self.probe_interval
+                    self.probe_seq += 1
+                    content = "probe-%d" % self.probe_seq
+                    for _ in range(self.danmu_limit):
+                        await self.ws_send(writer, json.dumps({"op": "newdanmu", "danmu": content, "userid": rng.randint(1, self.users), "sid": "x"}))
+                    self.probes[content] = time.monotonic()
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+
+    # ---------- HTTP ----------
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                parts = urlsplit(target)
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self.websocket(reader, writer, headers)
+                    return
+                length = int(headers.get("content-length") or 0)
+                body = await reader.readexactly(length) if length else b""
+                if self.user_delay and parts.path == "/v/course_meta/fetch_user_info_new":
+                    await asyncio.sleep(self.user_delay)
+                if self.ppt_delay and parts.path == "/api/v3/lesson/presentation/fetch":
+                    await asyncio.sleep(self.ppt_delay)
+                status, extra, data = self.rest(method, parts.path, parse_qs(parts.query), body, headers)
+                payload = json.dumps(data, ensure_ascii=False).encode("utf-8") if data is not None else b""
+                reason = {200: "OK", 304: "Not Modified"}.get(status, "Error")
+                response = ["HTTP/1.1 %d %s" % (status, reason)]
+                if data is not None:
+                    response.append("Content-Type: application/json; charset=utf-8")
+                response.append("Content-Length: %d" % len(payload))
+                response += ["%s: %s" % item for item in extra.items()]
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        self.latencies = []
+        def pick(p):
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0
+        return "连接 %(sockets)d  推送帧 %(frames_sent)d  收到帧 %(frames_received)d  REST %(rest)d  签到失败 %(checkin_failed)d  PPT未修改 %(not_modified)d  断线 %(dropped)d  弹幕发送 %(danmu_send)d" % self.stats + \
+            "  探测延迟(%d次) p50 %.1fms p95 %.1fms max %.1fms  未响应探测 %d" % (len(latencies), pick(0.5), pick(0.95), pick(1.0), len(self.probes))
+
+    async def serve(self, host, port, report_interval):
+        server = await asyncio.start_server(self.handle, host, port)
+        print("模拟服务已启动：http://%s:%d  ws://%s:%d/wsapp/  课程数 %d" % (host, port, host, port, len(self.lessons)))
+        async with server:
+            while True:
+                await asyncio.sleep(report_interval)
+                print(self.summary(), flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟雨课堂服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--lessons", type=int, default=10, help="同时上课的课程数")
+    parser.add_argument("--danmu-rate", type=float, default=1.0, help="每个课程每秒的弹幕数")
+    parser.add_argument("--slide-rate", type=float, default=0.1, help="每个课程每秒的翻页数")
+    parser.add_argument("--problem-interval", type=float, default=60, help="每个课程发题间隔（秒），0为不发题")
+    parser.add_argument("--call-interval", type=float, default=120, help="每个课程点名间隔（秒），0为不点名")
+    parser.add_argument("--probe-interval", type=float, default=10, help="延迟探测间隔（秒），0为不探测")
+    parser.add_argument("--danmu-limit", type=int, default=5, help="与客户端danmu_limit一致，用于延迟探测")
+    parser.add_argument("--slides", type=int, default=100, help="每份PPT的页数")
+    parser.add_argument("--users", type=int, default=200, help="每个课程的同学数")
+    parser.add_argument("--user-delay", type=float, default=0.0, help="用户信息接口的模拟延迟（秒）")
+    parser.add_argument("--checkin-fail-rate", type=float, default=0.0, help="签到请求不返回Set-Auth的概率")
+    parser.add_argument("--drop-interval", type=float, default=0, help="每个websocket连接保持多少秒后被服务端断开，0为不断开")
+    parser.add_argument("--stall", action="store_true", help="到达drop_interval时连接静默而不断开（模拟半开连接）")
+    parser.add_argument("--decks", type=int, default=1, help="每个课程hello时已放映的PPT数")
+    parser.add_argument("--ppt-delay", type=float, default=0.0, help="PPT接口的模拟延迟（秒）")
+    parser.add_argument("--report-interval", type=float, default=5, help="统计输出间隔（秒）")
+    args = parser.parse_args(argv)
+    server = MockServer(
+        lessons=args.lessons, danmu_rate=args.danmu_rate, slide_rate=args.slide_rate,
+        problem_interval=args.problem_interval, call_interval=args.call_interval,
+        probe_interval=args.probe_interval, danmu_limit=args.danmu_limit, slides=args.slides,
+        users=args.users, user_delay=args.user_delay, checkin_fail_rate=args.checkin_fail_rate,
+        drop_interval=args.drop_interval, stall=args.stall, decks=args.decks, ppt_delay=args.ppt_delay,
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.report_interval))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
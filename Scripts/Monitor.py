@@ -1,30 +1,125 @@
 import time
 import requests
 import threading
-from Scripts.Utils import get_on_lesson, test_network
+from Scripts import Http, Decoder, Recorder, Metrics, Profiler
+from Scripts.Utils import get_on_lesson, test_network, get_user_info
 from Scripts.Classes import Lesson
+from Scripts.Sink import AccountSink
+from Scripts.Scheduler import get_scheduler
+from Scripts.Timetable import get_timetable
+from Scripts.AsyncEngine import AsyncEngine, async_available
+from Scripts.Supervisor import Supervisor
 
-def monitor(main_ui):
+# 停止监听时等待课程线程结束的最长时间（秒）
+CLOSE_WAIT = 5
+
+def monitor(sink):
     # 监听器函数
+    Decoder.set_backend(sink.config.get("json_backend", "auto"))
+    Http.set_base_urls(sink.config.get("api_base"), sink.config.get("wss_url"))
+    Metrics.configure(sink.config)
+    if Profiler.start_on_launch(sink.config):
+        Profiler.start(sink, sink.config)
+    try:
+        # 配置了record_path时录制本次监听的websocket帧与REST响应
+        if sink.config.get("record_path"):
+            Recorder.start_recording(sink.config["record_path"])
+            try:
+                return _monitor(sink)
+            finally:
+                Recorder.stop_recording()
+        return _monitor(sink)
+    finally:
+        get_timetable(sink.config).flush()
+
+def account_sinks(sink):
+    # 配置了accounts时，主账号与其他账号各自一个AccountSink，登录失效的账号跳过；
+    # 各账号共用进程内的连接池、PPT缓存、同学目录与分发池，只有上课列表轮询与课程是各自的
+    accounts = sink.config.get("accounts") or []
+    if not accounts:
+        return [sink]
+    if sink.config.get("sessionid"):
+        accounts = [{"sessionid": sink.config["sessionid"]}] + list(accounts)
+    sinks = []
+    seen = set()
+    for index, account in enumerate(accounts):
+        sessionid = account.get("sessionid")
+        if not sessionid or sessionid in seen:
+            continue
+        seen.add(sessionid)
+        name = account.get("name") or "账号%d" % (index + 1)
+        try:
+            code, user_info = get_user_info(sessionid)
+        except Exception:
+            code = -1
+        if code != 0:
+            sink.add_message("%s登录状态失效，已跳过" % name,0)
+            continue
+        sink.add_message("%s已加入监听，当前登录用户：%s" % (name, user_info["name"]),0)
+        sinks.append(AccountSink(sink, account, name))
+    return sinks
+
+def close_lessons(on_lessons, timeout=CLOSE_WAIT):
+    # 关闭全部课程的websocket，on_lessons在多线程操作之下，需要先复制
+    for lesson in list(on_lessons.values()):
+        lesson.close_socket()
+    # 等待各课程线程移出监听列表，使停止后不再有课程输出信息
+    deadline = time.monotonic() + timeout
+    while on_lessons and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+def _monitor(sink):
+    sinks = account_sinks(sink)
+    if not sinks:
+        sink.add_message("没有可用的账号，监听结束",0)
+        return
+    # 配置了工作进程数时，课程分散到多个进程中运行
+    workers = int(sink.config.get("supervisor_workers", 0) or 0)
+    if workers > 0:
+        return Supervisor(sink, sinks, workers).run()
+    # 配置engine为asyncio时，全部账号的全部课程运行在同一个事件循环中
+    if sink.config.get("engine") == "asyncio":
+        if async_available():
+            return AsyncEngine(sinks).run()
+        sink.add_message("未安装aiohttp，asyncio引擎不可用，已使用线程模式",0)
+    if len(sinks) == 1:
+        return _monitor_account(sinks[0])
+    # 多账号：每个账号一个轮询线程
+    threads = [threading.Thread(target=_monitor_account,args=(account_sink,),daemon=True) for account_sink in sinks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def _monitor_account(sink):
+    # 单个账号的监听主循环
 
     def del_onclass(lesson_obj):
         # 作为回调函数传入start_lesson
-        on_lesson_list.remove(lesson_obj)
+        on_lessons.pop(lesson_obj.lessonid, None)
 
-    # 已经签到完成加入监听列表的课程
-    on_lesson_list = []
+    # 已经签到完成加入监听列表的课程：lessonId -> Lesson
+    on_lessons = {}
     # 检测到的未加入监听列表的课程
     lesson_list = []
     network_status = True
-    sessionid = main_ui.config["sessionid"]
+    sessionid = sink.config["sessionid"]
+    scheduler = get_scheduler(sink.config)
+    timetable = get_timetable(sink.config)
+    # 以往记录的上课时间作为密集轮询的时段
+    for start in timetable.start_times():
+        scheduler.learn(start)
     while True:
+        cycle_start = time.monotonic()
+        # 即将上课的班级提前预热
+        timetable.prewarm_due(sink.config, sink.account)
         # 获取课程列表
         try:
             lesson_list = get_on_lesson(sessionid)
             # lesson_list_old = get_on_lesson_old()
         except requests.exceptions.ConnectionError:
             meg = "网络异常，监听中断"
-            main_ui.add_message_signal.emit(meg,8)
+            sink.add_message(meg,8)
             network_status = False
         except Exception:
             pass
@@ -40,43 +135,39 @@ def monitor(main_ui):
                 else:
                     network_status = True
                     meg = "网络已恢复，监听开始"
-                    main_ui.add_message_signal.emit(meg,8)
+                    sink.add_message(meg,8)
                     break
-            # 可结束线程的计时器
-            timer = 0
-            while timer <= 5:
-                time.sleep(1)
-                timer += 1
-                if not main_ui.is_active:
-                    # 由于on_lesson_list在多线程操作之下，此处必须使用列表复制，以保证列表完整性
-                    for lesson in on_lesson_list.copy():
-                        lesson.wsapp.close()
-                    return
+            # 停止监听时立即返回
+            if not sink.wait(5):
+                close_lessons(on_lessons)
+                return
         # 课程列表
+        found_new = False
         for lesson in lesson_list:
             lessionid = lesson["lessonId"]
+            # 已在监听的课程不再重复创建Lesson
+            if lessionid in on_lessons:
+                continue
             lessonname = lesson["courseName"]
             classroomid = lesson["classroomId"]
-            lesson_obj = Lesson(lessionid,lessonname,classroomid,main_ui)
-            if lesson_obj not in on_lesson_list:
-                thread = threading.Thread(target=lesson_obj.start_lesson,args=(del_onclass,),daemon=True)
-                thread.start()
-                meg = "检测到课程%s正在上课，已加入监听列表" % lessonname
-                main_ui.add_message_signal.emit(meg,7)
-                on_lesson_list.append(lesson_obj)
+            lesson_obj = Lesson(lessionid,lessonname,classroomid,sink)
+            # 先加入监听列表再启动线程，保证结束回调移除时课程已在列表中
+            on_lessons[lessionid] = lesson_obj
+            thread = threading.Thread(target=lesson_obj.start_lesson,args=(del_onclass,),daemon=True)
+            thread.start()
+            meg = "检测到课程%s正在上课，已加入监听列表" % lessonname
+            sink.add_message(meg,7)
+            scheduler.learn(time.time())
+            found_new = True
+            Metrics.LESSONS_DISCOVERED.inc()
         
         # for lesson in lesson_list_old:
         #     lessionid = lesson["lesson_id"]
         #     lessonname = lesson["classroom"]["name"]
         #     classroomid = lesson["classroomId"]
 
-        # 可结束线程的计时器
-        timer = 0
-        while timer <= 30:
-            time.sleep(1)
-            timer += 1
-            if not main_ui.is_active:
-                # 由于on_lesson_list在多线程操作之下，此处必须使用列表复制，以保证列表完整性
-                for lesson in on_lesson_list.copy():
-                    lesson.wsapp.close()
-                return
\ No newline at end of file
+        Metrics.DISCOVERY_SECONDS.observe(time.monotonic() - cycle_start)
+        # 按调度等待下一次轮询，停止监听时立即返回
+        if not sink.wait(scheduler.next_delay(found_new)):
+            close_lessons(on_lessons)
+            return
\ No newline at end of file
@@ -0,0 +1,185 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from Scripts.Utils import get_cache_dir
+
+# 按需性能分析：运行期间对消息处理路径进行分析，持续若干秒后写入结果文件并报告耗时最多的消息类型
+# cprofile模式：写入pstats文件（.prof）。Python 3.12起cProfile基于sys.monitoring，同一时间只能启用一个，
+# 且启用后记录全部线程，因此只在分析线程中启用一个（记录进程内全部线程）；更早的版本cProfile只记录启用它的线程，
+# 在处理消息的各线程中分别启用，结束后合并
+# sample模式：后台线程定时采样全部线程的调用栈，写入collapsed stack文件（.collapsed，可用于生成火焰图）
+# 未在分析时session为None，消息路径上只有一次全局变量判断
+
+DEFAULT_MODE = "sample"
+DEFAULT_SECONDS = 30
+DEFAULT_TOP = 10
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+# cProfile是否对全部线程生效（Python 3.12+）
+PROCESS_WIDE = sys.version_info >= (3, 12)
+
+# 正在进行的分析，未分析时为None
+session = None
+_session_lock = threading.Lock()
+# 开始分析时调用的函数 hook(mode, seconds)，Supervisor借此让工作进程同时开始分析
+start_hooks = []
+
+class ProfileSession:
+    def __init__(self, sink, mode, seconds, top, path):
+        self.sink = sink
+        self.mode = mode
+        self.seconds = seconds
+        self.top = top
+        self.path = path
+        self.lock = threading.Lock()
+        # 消息类型 -> [次数, 总耗时, 最长耗时]
+        self.ops = {}
+        self.local = threading.local()
+        self.profiles = []
+        self.samples = Counter()
+        self.sample_count = 0
+        self.stopped = threading.Event()
+
+    def call(self, func, *args):
+        # 在当前线程的cProfile中执行（sample模式或进程级cProfile时直接执行）
+        if self.mode != "cprofile" or PROCESS_WIDE or getattr(self.local, "active", False):
+            return func(*args)
+        profile = getattr(self.local, "profile", None)
+        if profile is None:
+            profile = self.local.profile = cProfile.Profile()
+            with self.lock:
+                self.profiles.append(profile)
+        self.local.active = True
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            self.local.active = False
+
+    def record(self, op, seconds):
+        with self.lock:
+            entry = self.ops.get(op)
+            if entry is None:
+                entry = self.ops[op] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+    def _sample(self):
+        # 采样全部线程（采样线程自身除外）的调用栈，按 线程名;外层函数;...;内层函数 汇总
+        own = threading.get_ident()
+        names = {}
+        names_updated = 0
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            now = time.monotonic()
+            if now - names_updated > 1:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                names_updated = now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def run(self):
+        # 持续seconds秒后写入结果并报告
+        global session
+        profile = None
+        if self.mode == "sample":
+            threading.Thread(target=self._sample, name="profile-sampler", daemon=True).start()
+        elif PROCESS_WIDE:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # 已有其他分析工具（如在cProfile下运行本程序）
+                with _session_lock:
+                    if session is self:
+                        session = None
+                self.sink.add_message("性能分析无法开始：%s" % e,0)
+                return
+            self.profiles.append(profile)
+        self.stopped.wait(self.seconds)
+        self.stopped.set()
+        if profile is not None:
+            profile.disable()
+        with _session_lock:
+            if session is self:
+                session = None
+        try:
+            path = self._write()
+        except OSError as e:
+            self.sink.add_message("性能分析结果写入失败：%s" % e,0)
+            return
+        self.sink.add_message("性能分析结束（%s模式，%d秒）：%s" % (self.mode, self.seconds, path),0)
+        for line in self.report():
+            self.sink.add_message(line,0)
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self.mode == "cprofile":
+            path = self.path + ".prof"
+            with self.lock:
+                profiles = list(self.profiles)
+            if profiles:
+                stats = pstats.Stats(profiles[0])
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                stats.dump_stats(path)
+            else:
+                open(path,"wb").close()
+            return path
+        path = self.path + ".collapsed"
+        with open(path,"w",encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write("%s %d\n" % (stack, count))
+        return path
+
+    def report(self):
+        # 按总耗时排序的前top个消息类型
+        with self.lock:
+            ops = sorted(self.ops.items(), key=lambda item: item[1][1], reverse=True)[:self.top]
+        if not ops:
+            return ["分析期间没有处理消息"]
+        lines = ["耗时最多的消息类型（共%d类）：" % len(self.ops)]
+        for op, (count, total, longest) in ops:
+            lines.append("%s：%d次，合计%.1fms，平均%.2fms，最长%.1fms" % (op, count, total * 1000, total / count * 1000, longest * 1000))
+        return lines
+
+def start(sink, config, mode=None, seconds=None):
+    '''
+    开始一次性能分析，已在分析时返回None
+    mode: cprofile / sample，默认为配置项profile_mode
+    seconds: 分析时长，默认为配置项profile_seconds
+    '''
+    global session
+    mode = mode or config.get("profile_mode", DEFAULT_MODE)
+    if mode not in ("cprofile", "sample"):
+        mode = DEFAULT_MODE
+    seconds = seconds or config.get("profile_seconds", DEFAULT_SECONDS)
+    name = "profile-%s-%d" % (time.strftime("%Y%m%d-%H%M%S"), os.getpid())
+    path = os.path.join(get_cache_dir(config), "profiles", name)
+    with _session_lock:
+        if session is not None:
+            return None
+        session = ProfileSession(sink, mode, seconds, config.get("profile_top", DEFAULT_TOP), path)
+        current = session
+    sink.add_message("开始性能分析（%s模式，%d秒）" % (mode, seconds),0)
+    threading.Thread(target=current.run, name="profiler", daemon=True).start()
+    for hook in start_hooks:
+        hook(mode, seconds)
+    return current
+
+def start_on_launch(config):
+    # 配置了profile_on_start或开启debug_mode时，启动监听后立即分析一次
+    return bool(config.get("profile_on_start") or config.get("debug_mode"))
@@ -0,0 +1,91 @@
+import itertools
+from collections import OrderedDict, deque
+
+# 弹幕滑动窗口计数
+# 每个内容一个时间戳队列，另有一个全局过期队列按到达顺序记录 (时间, 内容, 代号)，
+# 调用方传入time.monotonic()，时间戳单调递增，过期只需从全局队列头部弹出，插入与过期均摊O(1)。
+# 不同内容的数量超过上限时按LRU淘汰，内存有界。
+
+DEFAULT_WINDOW = 60
+DEFAULT_MAX_KEYS = 2000
+
+class _Record:
+    __slots__ = ("gen", "times")
+
+    def __init__(self, gen):
+        self.gen = gen
+        self.times = deque()
+
+class DanmuWindow:
+    def __init__(self, window=DEFAULT_WINDOW, max_keys=DEFAULT_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        # 内容 -> _Record，按最近出现排序（末尾为最新）
+        self.records = OrderedDict()
+        # (时间, 内容, 代号)，代号用于识别被重置或淘汰后残留的过期项
+        self.expiry = deque()
+        # 内容 -> 最近一次自动发送的时间，按发送时间排序
+        self.sent = OrderedDict()
+        self._gen = itertools.count()
+        self._expired_at = None
+
+    def _expire(self, now):
+        # 清除超过窗口时长的记录，同一时刻只需执行一次
+        if now == self._expired_at:
+            return
+        self._expired_at = now
+        expiry = self.expiry
+        records = self.records
+        while expiry and now - expiry[0][0] > self.window:
+            _, key, gen = expiry.popleft()
+            record = records.get(key)
+            if record is not None and record.gen == gen:
+                record.times.popleft()
+                if not record.times:
+                    del records[key]
+        sent = self.sent
+        while sent:
+            key, sent_time = next(iter(sent.items()))
+            if now - sent_time <= self.window:
+                break
+            sent.popitem(last=False)
+
+    def count(self, key, now):
+        # 窗口内该内容出现的次数
+        self._expire(now)
+        record = self.records.get(key)
+        return len(record.times) if record is not None else 0
+
+    def add(self, key, now):
+        # 记录一次出现，返回窗口内的次数
+        self._expire(now)
+        record = self.records.get(key)
+        if record is None:
+            record = _Record(next(self._gen))
+            self.records[key] = record
+            if len(self.records) > self.max_keys:
+                self.records.popitem(last=False)
+        else:
+            self.records.move_to_end(key)
+        record.times.append(now)
+        self.expiry.append((now, key, record.gen))
+        return len(record.times)
+
+    def reset(self, key):
+        # 清空该内容的计数，全局队列中的残留项会因代号不同被忽略
+        self.records.pop(key, None)
+
+    def mark_sent(self, key, now):
+        # 记录自动发送时间
+        self.sent.pop(key, None)
+        self.sent[key] = now
+        if len(self.sent) > self.max_keys:
+            self.sent.popitem(last=False)
+
+    def sent_recently(self, key, now):
+        # 窗口时长内是否已经自动发送过该内容
+        self._expire(now)
+        return key in self.sent
+
+    def __len__(self):
+        return len(self.records)
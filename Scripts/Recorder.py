@@ -0,0 +1,85 @@
+import gzip
+import json
+import time
+import threading
+from urllib.parse import urlsplit
+from Scripts import Http
+
+# 会话录制：将收到的websocket原始帧与REST响应写入gzip压缩的JSON Lines文件，
+# 供Scripts.Replay离线回放。每行一条记录：
+# {"t": 相对开始的秒数, "kind": "lesson", "lesson": lessonid, "name": 课程名, "classroom": 班级id}
+# {"t": ..., "kind": "frame", "lesson": lessonid, "data": 原始帧}
+# {"t": ..., "kind": "http", "method": "GET", "path": "/api/...?...", "status": 200, "headers": {...}, "body": "..."}
+
+# 回放时需要用到的响应头
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Set-Auth")
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.count = 0
+        self.lessons = set()
+
+    def _write(self, record):
+        record["t"] = round(time.monotonic() - self.start, 6)
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line + "\n")
+            self.count += 1
+
+    def frame(self, lesson, message):
+        # 每个课程第一次出现时额外记录课程名与班级id
+        if lesson.lessonid not in self.lessons:
+            self.lessons.add(lesson.lessonid)
+            self._write({"kind": "lesson", "lesson": lesson.lessonid, "name": lesson.lessonname, "classroom": lesson.classroomid})
+        if isinstance(message, bytes):
+            message = message.decode("utf-8", "replace")
+        self._write({"kind": "frame", "lesson": lesson.lessonid, "data": message})
+
+    def http(self, method, url, response):
+        # 304等无内容的响应无法回放，不记录；PPT缓存命中时由cached记录实际使用的内容
+        if response.status_code == 304:
+            return
+        headers = {key: response.headers[key] for key in KEPT_HEADERS if key in response.headers}
+        self._write_http(method, url, response.status_code, headers, response.content)
+
+    def cached(self, method, url, headers, body):
+        # 条件请求返回304、内容取自本地缓存时，按200响应记录缓存中的内容
+        self._write_http(method, url, 200, {key: value for key, value in headers.items() if value}, body)
+
+    def _write_http(self, method, url, status, headers, body):
+        parts = urlsplit(url)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        self._write({
+            "kind": "http", "method": method, "path": path, "status": status,
+            "headers": headers, "body": body.decode("utf-8", "replace"),
+        })
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+# 当前生效的录制器，未录制时为None
+recorder = None
+
+def start_recording(path):
+    # 开始录制，重复调用时沿用已有录制器
+    global recorder
+    if recorder is None:
+        recorder = Recorder(path)
+        Http.response_hooks.append(recorder.http)
+    return recorder
+
+def stop_recording():
+    global recorder
+    if recorder is not None:
+        Http.response_hooks.remove(recorder.http)
+        recorder.close()
+        recorder = None
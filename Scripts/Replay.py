@@ -0,0 +1,244 @@
+import sys
+import gzip
+import json
+import time
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from Scripts import Http
+from Scripts.Sink import EventSink
+from Scripts.Classes import Lesson
+from Scripts.Utils import get_initial_data
+
+# 离线回放：读取Scripts.Recorder录制的文件，在本地桩HTTP服务上重放REST响应，
+# 并将websocket帧按实时、加速或最快速度送入Lesson，统计整条消息处理链路的吞吐与延迟
+# 用法：python -m Scripts.Replay session.jsonl.gz [--speed 0] [--verbose]
+
+def load_recording(path):
+    # 读取录制文件，返回(课程信息, 帧列表, REST响应字典)
+    lessons = {}
+    frames = []
+    responses = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["kind"] == "lesson":
+                lessons[record["lesson"]] = record
+            elif record["kind"] == "frame":
+                frames.append(record)
+            elif record["kind"] == "http":
+                # 同一请求录到多次时按顺序依次返回，最后一次重复使用
+                responses.setdefault((record["method"], record["path"]), []).append(record)
+    frames.sort(key=lambda record: record["t"])
+    return lessons, frames, responses
+
+class StubServer:
+    # 按录制内容应答REST请求的本地HTTP服务
+    # 未录制的用户信息、弹幕发送返回默认的成功响应，其余未录制请求返回404
+    DEFAULTS = {
+        ("GET", "/api/v3/user/basic-info"): {"code": 0, "data": {"id": 0, "name": ""}},
+        ("POST", "/api/v3/lesson/danmu/send"): {"code": 0, "data": {}},
+    }
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                status, headers, body = stub.lookup(self.command, self.path)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _reply
+            do_POST = _reply
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def lookup(self, method, path):
+        with self.lock:
+            self.requests += 1
+            records = self.responses.get((method, path))
+            if records:
+                position = self.positions.get((method, path), 0)
+                self.positions[(method, path)] = position + 1
+                record = records[min(position, len(records) - 1)]
+                return record["status"], record["headers"], record["body"].encode("utf-8")
+        default = self.DEFAULTS.get((method, path.split("?")[0]))
+        if default is not None:
+            return 200, {"Content-Type": "application/json"}, json.dumps(default).encode("utf-8")
+        return 404, {}, b'{"code":404,"data":{}}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class CountingSink(EventSink):
+    # 回放用的输出：统计信息条数，verbose时打印
+    def __init__(self, config, verbose=False):
+        super().__init__(config)
+        self.verbose = verbose
+        self.messages = 0
+        self.lock = threading.Lock()
+
+    def add_message(self, message, type=0):
+        with self.lock:
+            self.messages += 1
+        if self.verbose:
+            print("[%d] %s" % (type, message))
+
+class ReplaySocket:
+    # 代替websocket连接，记录发送的帧
+    def __init__(self):
+        self.sent = 0
+        self.closed = False
+
+    def send(self, text):
+        self.sent += 1
+
+    def close(self):
+        self.closed = True
+
+class TimedDispatcher:
+    # 包装Dispatcher，统计每帧从入队到处理完毕的耗时；后台获取的PPT重新入队的解析任务不是websocket帧，不计入
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def submit(self, key, func, *args, droppable=False):
+        if getattr(func, "__func__", None) is not Lesson._handle_message:
+            return self.dispatcher.submit(key, func, *args, droppable=droppable)
+        received = time.perf_counter()
+
+        def timed(*args):
+            try:
+                func(*args)
+            finally:
+                latency = time.perf_counter() - received
+                with self.lock:
+                    self.latencies.append(latency)
+
+        return self.dispatcher.submit(key, timed, *args, droppable=droppable)
+
+    def wait_idle(self, key, timeout=None):
+        return self.dispatcher.wait_idle(key, timeout)
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+def replay(path, speed=0, verbose=False, config=None):
+    '''
+    回放录制文件，返回统计结果
+    speed: 1为实时，大于1为加速倍数，0为不等待、以最快速度送入
+    '''
+    lesson_info, frames, responses = load_recording(path)
+    stub = StubServer(responses)
+    stub.start()
+    old_base = Http.API_BASE
+    Http.API_BASE = stub.base_url
+    cache_dir = tempfile.TemporaryDirectory()
+    try:
+        if config is None:
+            config = get_initial_data()
+        config = dict(config)
+        # 回放不使用本地PPT缓存，避免条件请求命中录制中不存在的304
+        config["ppt_cache_mb"] = 0
+        config["cache_dir"] = cache_dir.name
+        config["sessionid"] = config.get("sessionid") or "replay"
+        sink = CountingSink(config, verbose)
+
+        lessons = {}
+        sockets = {}
+        dispatcher = None
+        for record in frames:
+            lessonid = record["lesson"]
+            if lessonid in lessons:
+                continue
+            info = lesson_info.get(lessonid, {})
+            lesson = Lesson(lessonid, info.get("name", str(lessonid)), info.get("classroom", lessonid), sink)
+            dispatcher = TimedDispatcher(lesson.dispatcher) if dispatcher is None else dispatcher
+            lesson.dispatcher = dispatcher
+            lessons[lessonid] = lesson
+            sockets[lessonid] = ReplaySocket()
+
+        start = time.perf_counter()
+        first_t = frames[0]["t"] if frames else 0
+        for record in frames:
+            if speed:
+                due = start + (record["t"] - first_t) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            lessonid = record["lesson"]
+            lessons[lessonid].on_message(sockets[lessonid], record["data"])
+        for lesson in lessons.values():
+            # 处理消息时会产生新的后台任务（获取PPT、同学信息），其结果又作为消息重新入队，
+            # 直到分发队列空闲且期间没有新的后台任务
+            while True:
+                lesson.wait_presentations()
+                lesson.classmates.wait_pending()
+                dispatcher.wait_idle(lesson.key)
+                if not lesson.ppt_futures and not lesson.classmates.fetching:
+                    break
+        elapsed = time.perf_counter() - start
+        latencies = dispatcher.latencies if dispatcher else []
+        return {
+            "frames": len(frames),
+            "lessons": len(lessons),
+            "elapsed": elapsed,
+            "frames_per_second": len(frames) / elapsed if elapsed else 0,
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p95": percentile(latencies, 0.95),
+            "latency_p99": percentile(latencies, 0.99),
+            "latency_max": max(latencies) if latencies else 0,
+            "messages": sink.messages,
+            "http_requests": stub.requests,
+            "dropped": dispatcher.dispatcher.stats()["dropped"] if dispatcher else 0,
+        }
+    finally:
+        Http.API_BASE = old_base
+        stub.stop()
+        cache_dir.cleanup()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放录制的雨课堂会话")
+    parser.add_argument("recording", help="Scripts.Recorder录制的.jsonl.gz文件")
+    parser.add_argument("--speed", type=float, default=0, help="回放速度：1为实时，10为10倍速，0为最快（默认）")
+    parser.add_argument("--verbose", action="store_true", help="打印Lesson输出的信息")
+    args = parser.parse_args(argv)
+    result = replay(args.recording, args.speed, args.verbose)
+    print("帧数 %(frames)d，课程数 %(lessons)d，耗时 %(elapsed).3fs，吞吐 %(frames_per_second).0f 帧/秒" % result)
+    print("处理延迟 p50 %.2fms  p95 %.2fms  p99 %.2fms  max %.2fms" % tuple(result[key] * 1000 for key in ("latency_p50", "latency_p95", "latency_p99", "latency_max")))
+    print("输出信息 %(messages)d 条，REST请求 %(http_requests)d 次，丢弃 %(dropped)d 帧" % result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import time
+import threading
+
+# 上课列表轮询调度：在已知的上课时间附近密集轮询，其余时间逐步退避
+# 上课时间以“每周第几秒”记录，同一课程每周同一时间上课
+
+WEEK_SECONDS = 7 * 24 * 3600
+# 已知上课时间前后的密集轮询窗口（秒）
+WINDOW_BEFORE = 10 * 60
+WINDOW_AFTER = 20 * 60
+
+def week_second(timestamp=None):
+    # 时间戳对应的本周第几秒（周一0点为0）
+    t = time.localtime(timestamp)
+    return t.tm_wday * 24 * 3600 + t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec
+
+class DiscoveryScheduler:
+    '''
+    fast_interval: 上课时间附近以及刚发现新课程后的轮询间隔（秒）
+    idle_interval: 退避后的最大轮询间隔（秒）
+    '''
+    def __init__(self, fast_interval=3, idle_interval=30):
+        self.fast_interval = fast_interval
+        self.idle_interval = max(idle_interval, fast_interval)
+        self.interval = fast_interval
+        # 已知的上课时间（每周第几秒，按分钟取整）
+        self.start_times = set()
+        self.lock = threading.Lock()
+
+    def learn(self, timestamp):
+        # 记录一次上课时间
+        with self.lock:
+            self.start_times.add(week_second(timestamp) // 60 * 60)
+
+    def _hot(self, now):
+        # 当前是否处于某个上课时间的密集轮询窗口内
+        second = week_second(now)
+        for start in self.start_times:
+            if (second - start) % WEEK_SECONDS <= WINDOW_AFTER or (start - second) % WEEK_SECONDS <= WINDOW_BEFORE:
+                return True
+        return False
+
+    def _until_next_window(self, now):
+        # 距离下一个密集轮询窗口开始的秒数，没有已知上课时间时返回None
+        if not self.start_times:
+            return None
+        second = week_second(now)
+        return min((start - WINDOW_BEFORE - second) % WEEK_SECONDS for start in self.start_times)
+
+    def next_delay(self, found_new=False, now=None):
+        # 计算下一次轮询前的等待时间
+        # 发现新课程或处于上课时间附近时使用fast_interval，否则每次翻倍直至idle_interval，
+        # 且不会越过下一个上课时间窗口的开始
+        if now is None:
+            now = time.time()
+        with self.lock:
+            if found_new or self._hot(now):
+                self.interval = self.fast_interval
+                return self.fast_interval
+            delay = self.interval
+            self.interval = min(self.interval * 2, self.idle_interval)
+            until = self._until_next_window(now)
+            if until is not None:
+                delay = min(delay, max(until, self.fast_interval))
+            return delay
+
+def get_scheduler(config):
+    return DiscoveryScheduler(
+        config.get("discovery_fast_interval", 3),
+        config.get("discovery_idle_interval", 30),
+    )
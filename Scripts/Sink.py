@@ -0,0 +1,194 @@
+import sys
+import json
+import time
+import threading
+
+# 事件输出接口：Lesson与monitor只通过它输出信息、维护监听列表，不依赖具体UI
+
+class EventSink:
+    '''
+    config: 当前配置（dict）
+    is_active: 是否处于监听状态，应通过stop()置为False以便monitor立即退出
+    account: 多账号监听时的账号名称，单账号时为None
+    '''
+    account = None
+
+    def __init__(self, config):
+        self.config = config
+        self.is_active = False
+        self.stop_cond = threading.Condition()
+        self.stop_callbacks = []
+
+    def stop(self):
+        # 停止监听，并唤醒正在wait的monitor
+        with self.stop_cond:
+            self.is_active = False
+            self.stop_cond.notify_all()
+            callbacks, self.stop_callbacks = self.stop_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_stop(self, callback):
+        # 注册停止监听时的回调，在调用stop()的线程中执行；已停止时立即执行
+        with self.stop_cond:
+            if self.is_active:
+                self.stop_callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout):
+        # 等待timeout秒，期间停止监听时立即返回；返回是否仍处于监听状态
+        with self.stop_cond:
+            self.stop_cond.wait_for(lambda: not self.is_active, timeout)
+        return self.is_active
+
+    def add_message(self, message, type=0):
+        # 输出信息，type含义见MainWindow_Ui.audio
+        raise NotImplementedError
+
+    def add_course(self, row, lessonid, stats=None):
+        # 加入监听列表，row为[课程名, 课程标题, 教师, 上课时间]
+        # stats为可选的无参函数，返回该课程的实时统计（见Lesson.stats）
+        pass
+
+    def del_course(self, lessonid):
+        # 移出监听列表
+        pass
+
+class JsonLinesSink(EventSink):
+    # 将事件以JSON Lines格式写入stdout或文件，供无界面守护进程使用
+    def __init__(self, config, stream=None):
+        super().__init__(config)
+        self.stream = stream if stream is not None else sys.stdout
+        self.lock = threading.Lock()
+        # lessonid -> (课程信息, 统计函数)
+        self.courses = {}
+
+    def _write(self, event):
+        event["time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        line = json.dumps(event, ensure_ascii=False)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def add_message(self, message, type=0):
+        self._write({"event":"message","type":type,"message":message})
+
+    def add_course(self, row, lessonid, stats=None):
+        with self.lock:
+            self.courses[lessonid] = (row, stats)
+        self._write({"event":"add_course","lesson":lessonid,"course":row})
+
+    def del_course(self, lessonid):
+        # 移出时附带课程的最终统计
+        with self.lock:
+            row, stats = self.courses.pop(lessonid, (None, None))
+        event = {"event":"del_course","lesson":lessonid,"course":row}
+        if stats is not None:
+            event["stats"] = stats()
+        self._write(event)
+
+class AccountSink(EventSink):
+    # 多账号监听时单个账号的输出：信息与课程名前加上账号名称后转交给主输出，
+    # 监听状态与停止均与主输出共用；账号中除name外的配置项覆盖主配置
+    def __init__(self, parent, account, name):
+        config = dict(parent.config)
+        config.update({key: value for key, value in account.items() if key != "name"})
+        config["accounts"] = []
+        super().__init__(config)
+        self.parent = parent
+        self.account = name
+
+    @property
+    def is_active(self):
+        return self.parent.is_active
+
+    @is_active.setter
+    def is_active(self, value):
+        # 由主输出统一控制，忽略EventSink.__init__中的赋值
+        pass
+
+    def stop(self):
+        self.parent.stop()
+
+    def wait(self, timeout):
+        return self.parent.wait(timeout)
+
+    def on_stop(self, callback):
+        self.parent.on_stop(callback)
+
+    def add_message(self, message, type=0):
+        self.parent.add_message("[%s]%s" % (self.account, message), type)
+
+    def add_course(self, row, lessonid, stats=None):
+        self.parent.add_course(["[%s]%s" % (self.account, row[0])] + list(row[1:]), lessonid, stats)
+
+    def del_course(self, lessonid):
+        self.parent.del_course(lessonid)
+
+# 信息合并输出：各线程的信息先放入缓冲，由UI线程定时批量取出显示
+# 每类信息按令牌桶限速（条/秒，允许2秒的突发），超出部分只计数，取出时汇总为一条提示
+# 题目、点名等重要信息（未配置限速的类型）从不丢弃
+DEFAULT_RATE_LIMITS = {0: 20, 1: 5, 2: 10}
+RATE_BURST_SECONDS = 2
+
+class MessageBatcher:
+    def __init__(self, rate_limits=None):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.rate_limits = {}
+        self.buckets = {}
+        self.suppressed = {}
+        self.set_rate_limits(rate_limits)
+        self._last_second = None
+        self._last_prefix = ""
+
+    def set_rate_limits(self, rate_limits=None):
+        # rate_limits: {类型: 每秒条数}，配置文件中的键为字符串
+        if rate_limits is None:
+            rate_limits = DEFAULT_RATE_LIMITS
+        with self.lock:
+            self.rate_limits = {int(type): rate for type, rate in rate_limits.items() if rate}
+            self.buckets = {}
+
+    def _allow(self, type, now):
+        rate = self.rate_limits.get(type)
+        if rate is None:
+            return True
+        burst = rate * RATE_BURST_SECONDS
+        tokens, last = self.buckets.get(type, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens < 1:
+            self.buckets[type] = (tokens, now)
+            return False
+        self.buckets[type] = (tokens - 1, now)
+        return True
+
+    def add(self, message, type=0):
+        # 可在任意线程中调用
+        now = time.time()
+        with self.lock:
+            if self._allow(type, time.monotonic()):
+                self.pending.append((now, message, type))
+            else:
+                self.suppressed[type] = self.suppressed.get(type, 0) + 1
+
+    def _prefix(self, timestamp):
+        # 同一秒内的信息复用格式化好的时间前缀
+        second = int(timestamp)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_prefix = time.strftime("[%Y-%m-%d %H:%M:%S] ", time.localtime(second))
+        return self._last_prefix
+
+    def drain(self):
+        # 取出缓冲中的全部信息，返回[(带时间前缀的文本, 原始信息, 类型)]
+        with self.lock:
+            pending, self.pending = self.pending, []
+            suppressed, self.suppressed = self.suppressed, {}
+        result = [(self._prefix(timestamp) + message, message, type) for timestamp, message, type in pending]
+        if suppressed:
+            total = sum(suppressed.values())
+            detail = "，".join("类型%d %d条" % item for item in sorted(suppressed.items()))
+            result.append((self._prefix(time.time()) + "信息过多，已省略%d条（%s）" % (total, detail), None, 0))
+        return result
@@ -0,0 +1,136 @@
+import time
+import heapq
+import itertools
+import threading
+
+# 语音播报：单个常驻线程复用同一个pyttsx3引擎，播报请求进入有界优先队列
+# 点名、题目等提醒优先播报，并可打断正在播报的弹幕；重复或过期的播报直接丢弃
+
+# 信息类型（见MainWindow_Ui.audio） -> 优先级，数值越小越优先
+PRIORITIES = {5: 0, 3: 1, 4: 2, 6: 3, 7: 4, 8: 4, 0: 5, 1: 5, 2: 6}
+# 可以被更高优先级提醒打断的优先级下限
+INTERRUPTIBLE = 5
+# 提醒类（优先级不大于该值）可以打断弹幕
+PREEMPTING = 1
+MAX_QUEUE = 20
+# 各优先级的最长等待时间（秒），超时未播报则丢弃
+STALE_SECONDS = {0: 120, 1: 120, 2: 60, 3: 60, 4: 60, 5: 15, 6: 10}
+# 同一内容在该时间内只播报一次
+DEDUP_SECONDS = 30
+
+class Speaker:
+    def __init__(self, max_queue=MAX_QUEUE):
+        self.max_queue = max_queue
+        self.cond = threading.Condition()
+        # 堆：(优先级, 序号, 入队时间, 文本)
+        self.queue = []
+        self.seq = itertools.count()
+        # 文本 -> 最近一次入队时间
+        self.recent = {}
+        self.thread = None
+        self.speaking_priority = None
+        self.preempt = False
+        # 语音引擎初始化失败的原因，失败后不再接受播报请求
+        self.error = None
+        # 初始化失败时调用一次 on_error(异常)，由界面设置以输出提示
+        self.on_error = None
+        self.stats = {"spoken": 0, "duplicate": 0, "stale": 0, "overflow": 0, "interrupted": 0, "unavailable": 0}
+
+    def say(self, text, type=0):
+        # 加入播报队列，可在任意线程中调用
+        priority = PRIORITIES.get(type, 5)
+        now = time.monotonic()
+        with self.cond:
+            if self.error is not None:
+                self.stats["unavailable"] += 1
+                return False
+            last = self.recent.get(text)
+            if last is not None and now - last < DEDUP_SECONDS:
+                self.stats["duplicate"] += 1
+                return False
+            if len(self.queue) >= self.max_queue:
+                # 队列已满：丢弃优先级最低的请求中最早入队的一条；新请求优先级更低时丢弃新请求
+                self.stats["overflow"] += 1
+                worst_priority = max(item[0] for item in self.queue)
+                if priority > worst_priority:
+                    return False
+                victim = min((item for item in self.queue if item[0] == worst_priority), key=lambda item: item[1])
+                self.queue.remove(victim)
+                heapq.heapify(self.queue)
+            self.recent[text] = now
+            if len(self.recent) > self.max_queue * 10:
+                self.recent = {key: value for key, value in self.recent.items() if now - value < DEDUP_SECONDS}
+            heapq.heappush(self.queue, (priority, next(self.seq), now, text))
+            if priority <= PREEMPTING and self.speaking_priority is not None and self.speaking_priority >= INTERRUPTIBLE:
+                self.preempt = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="tts", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        return True
+
+    def _next(self):
+        # 取出下一条未过期的播报
+        with self.cond:
+            while True:
+                while not self.queue:
+                    self.cond.wait()
+                priority, _, enqueued, text = heapq.heappop(self.queue)
+                if time.monotonic() - enqueued > STALE_SECONDS.get(priority, 60):
+                    self.stats["stale"] += 1
+                    continue
+                self.speaking_priority = priority
+                self.preempt = False
+                return text
+
+    def _fail(self, error):
+        # 语音引擎不可用：清空队列，之后的say()直接返回，避免队列无人取出而持续增长
+        with self.cond:
+            self.error = error
+            self.queue = []
+            self.speaking_priority = None
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def _init_engine(self):
+        # 延迟导入pyttsx3，无界面模式下不加载语音引擎
+        import pyttsx3
+        engine = pyttsx3.init()
+
+        def on_word(name, location, length):
+            # 在runAndWait所在线程中回调，收到更高优先级提醒时停止当前播报
+            if self.preempt:
+                self.preempt = False
+                self.stats["interrupted"] += 1
+                engine.stop()
+
+        engine.connect("started-word", on_word)
+        return engine
+
+    def _run(self):
+        try:
+            engine = self._init_engine()
+        except Exception as e:
+            self._fail(e)
+            return
+        while True:
+            text = self._next()
+            try:
+                engine.say(text)
+                engine.runAndWait()
+                self.stats["spoken"] += 1
+            except RuntimeError:
+                # 引擎状态异常时重新初始化
+                try:
+                    engine = self._init_engine()
+                except Exception as e:
+                    self._fail(e)
+                    return
+            finally:
+                with self.cond:
+                    self.speaking_priority = None
+
+_speaker = Speaker()
+
+def get_speaker():
+    return _speaker
@@ -0,0 +1,417 @@
+import time
+import bisect
+import signal
+import hashlib
+import threading
+import multiprocessing
+import requests
+from Scripts import Http, Decoder, Metrics, Profiler, Cache
+from Scripts.Utils import get_on_lesson
+from Scripts.Classes import Lesson, lesson_key
+from Scripts.Sink import EventSink, AccountSink
+from Scripts.Scheduler import get_scheduler
+from Scripts.Timetable import get_timetable, set_timetable
+
+# 多进程监听：主进程轮询上课列表，按lessonKey的一致性哈希把课程分配给若干工作进程，
+# 工作进程内以线程模式运行课程，信息、监听列表与统计通过multiprocessing队列交回主进程的EventSink。
+# 工作进程异常退出时以相同编号重启并重新分配其课程；调整进程数时只迁移哈希环上归属变化的课程。
+
+# 每个工作进程在哈希环上的虚拟节点数
+VNODES = 64
+# 检查工作进程存活、进程数配置的间隔（秒）
+CHECK_INTERVAL = 1
+# 工作进程上报各课程统计的间隔（秒）
+STATS_INTERVAL = 1
+# 停止时等待工作进程退出的时间（秒），超时后强制结束
+STOP_TIMEOUT = 10
+NETWORK_RETRY_INTERVAL = 5
+
+class HashRing:
+    def __init__(self, nodes=(), vnodes=VNODES):
+        self.vnodes = vnodes
+        # [(哈希值, 节点)]，按哈希值排序
+        self.ring = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(str(value).encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node):
+        for i in range(self.vnodes):
+            bisect.insort(self.ring, (self._hash("%s#%d" % (node, i)), node))
+
+    def remove(self, node):
+        self.ring = [item for item in self.ring if item[1] != node]
+
+    def owner(self, key):
+        # 顺时针方向第一个虚拟节点所属的节点
+        if not self.ring:
+            return None
+        index = bisect.bisect(self.ring, (self._hash(key),))
+        return self.ring[index % len(self.ring)][1]
+
+# ---------- 工作进程 ----------
+
+class _QueueSink(EventSink):
+    # 工作进程中的输出：事件放入队列交给主进程
+    def __init__(self, config, events):
+        super().__init__(config)
+        self.events = events
+        self.lock = threading.Lock()
+        # key -> 统计函数
+        self.stats = {}
+
+    def add_message(self, message, type=0):
+        self.events.put(("message", message, type))
+
+    def add_course(self, row, lessonid, stats=None):
+        with self.lock:
+            self.stats[lessonid] = stats
+        self.events.put(("add_course", row, lessonid))
+
+    def del_course(self, lessonid):
+        with self.lock:
+            stats = self.stats.pop(lessonid, None)
+        self.events.put(("del_course", lessonid, stats() if stats is not None else None))
+
+    def snapshot(self):
+        with self.lock:
+            stats = list(self.stats.items())
+        return {key: func() for key, func in stats if func is not None}
+
+class _TimetableForwarder:
+    # 工作进程中的课表：记录转交给主进程的课表统一保存
+    def __init__(self, events):
+        self.events = events
+
+    def record_start(self, *args):
+        self.events.put(("timetable", "record_start", args))
+
+    def record_end(self, *args):
+        self.events.put(("timetable", "record_end", args))
+
+    def record_presentation(self, *args):
+        self.events.put(("timetable", "record_presentation", args))
+
+def worker_main(worker_id, config, commands, events, workers):
+    # 工作进程入口，命令：("start", key, 账号名称, 账号配置, 课程信息) / ("drop", key) / ("profile", 模式, 时长) /
+    # ("cache_limit", 字节数) / ("retire",) / ("stop",)
+    # 终端中的Ctrl+C会发给整个进程组，工作进程忽略SIGINT，由主进程的stop命令统一结束
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Decoder.set_backend(config.get("json_backend", "auto"))
+    Http.set_base_urls(config.get("api_base"), config.get("wss_url"))
+    set_timetable(_TimetableForwarder(events))
+    # PPT缓存使用本进程的子目录，容量按工作进程数均分
+    Cache.set_ppt_cache(Cache.open_worker_cache(config, worker_id, workers))
+    # 工作进程只记录指标，由主进程汇总导出
+    Metrics.configure(config, serve=False)
+    sink = _QueueSink(config, events)
+    sink.is_active = True
+    account_sinks = {}
+    # key -> Lesson
+    lessons = {}
+
+    def report_stats():
+        while sink.wait(STATS_INTERVAL):
+            events.put(("stats", sink.snapshot()))
+            if Metrics.enabled:
+                events.put(("metrics", worker_id, Metrics.dump()))
+
+    def ended(lesson_obj):
+        lessons.pop(lesson_obj.key, None)
+        events.put(("ended", worker_id, lesson_obj.key))
+
+    threading.Thread(target=report_stats, daemon=True).start()
+    if Profiler.start_on_launch(config):
+        Profiler.start(sink, config)
+    while True:
+        command = commands.get()
+        if command[0] == "start":
+            _, key, name, account, info = command
+            if key in lessons:
+                continue
+            lesson_sink = sink
+            if name is not None:
+                if name not in account_sinks:
+                    account_sinks[name] = AccountSink(sink, account, name)
+                lesson_sink = account_sinks[name]
+            try:
+                lesson_obj = Lesson(info["lessonId"], info["courseName"], info["classroomId"], lesson_sink)
+            except Exception as e:
+                lesson_sink.add_message("%s加入监听失败：%s" % (info["courseName"], e),7)
+                events.put(("ended", worker_id, key))
+                continue
+            lessons[key] = lesson_obj
+            threading.Thread(target=lesson_obj.start_lesson,args=(ended,),daemon=True).start()
+        elif command[0] == "drop":
+            # 课程迁移到其他工作进程：不再重连，结束后由主进程重新分配
+            lesson_obj = lessons.get(command[1])
+            if lesson_obj is not None:
+                lesson_obj.migrating = True
+                lesson_obj.finished = True
+                lesson_obj.close_socket()
+        elif command[0] == "profile":
+            # 主进程开始性能分析时各工作进程同时分析，结果文件按进程号区分
+            Profiler.start(sink, config, command[1], command[2])
+        elif command[0] == "cache_limit":
+            cache = Cache.get_ppt_cache(config)
+            if cache is not None:
+                cache.set_limit(command[1])
+        elif command[0] in ("retire", "stop"):
+            if command[0] == "retire":
+                # 进程数减少时退出：课程将迁移到其他工作进程，不在此记录下课
+                for lesson_obj in list(lessons.values()):
+                    lesson_obj.migrating = True
+            sink.stop()
+            for lesson_obj in list(lessons.values()):
+                lesson_obj.close_socket()
+            deadline = time.monotonic() + STOP_TIMEOUT / 2
+            while lessons and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if command[0] == "retire":
+                # 本进程的缓存目录不再使用
+                Cache.remove_worker_cache(config, worker_id)
+            return
+
+# ---------- 主进程 ----------
+
+class _Worker:
+    def __init__(self, context, worker_id, config, events, workers):
+        self.worker_id = worker_id
+        self.commands = context.Queue()
+        self.process = context.Process(target=worker_main, args=(worker_id, config, self.commands, events, workers),
+                                       name="lesson-worker-%d" % worker_id, daemon=True)
+        self.process.start()
+
+class Supervisor:
+    def __init__(self, sink, sinks, workers):
+        '''
+        sink: 主输出，接收工作进程的全部事件
+        sinks: 各账号的EventSink（见Monitor.account_sinks），各自轮询上课列表
+        workers: 初始工作进程数，运行中按配置项supervisor_workers调整
+        '''
+        self.sink = sink
+        self.sinks = sinks
+        self.config = dict(sink.config)
+        # 使用spawn启动工作进程，避免fork时复制主进程中各线程持有的锁
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.lock = threading.Lock()
+        self.ring = HashRing()
+        # worker_id -> _Worker
+        self.workers = {}
+        self.next_worker_id = 0
+        # 正在退出、不再重启的工作进程
+        self.retiring = set()
+        # key -> (worker_id, 账号名称, 账号配置, 课程信息)
+        self.assigned = {}
+        # 正在迁移的课程，原进程结束后在新归属的进程中启动
+        self.moving = set()
+        # key -> 工作进程上报的最新统计
+        self.stats = {}
+        self.restarts = 0
+        self.timetable = get_timetable(sink.config)
+        self.target = workers
+
+    def run(self):
+        # PPT缓存由各工作进程在各自的目录中持有，主进程不使用
+        Cache.set_enabled(False)
+        Cache.remove_worker_caches(self.config, self.target)
+        self._resize(self.target)
+        Profiler.start_hooks.append(self._profile)
+        pump = threading.Thread(target=self._pump, name="supervisor-events", daemon=True)
+        pump.start()
+        threads = [threading.Thread(target=self._discover, args=(account_sink,), daemon=True) for account_sink in self.sinks]
+        for thread in threads:
+            thread.start()
+        while self.sink.wait(CHECK_INTERVAL):
+            self._check_workers()
+            target = int(self.sink.config.get("supervisor_workers", self.target) or 0)
+            if target > 0 and target != self.target:
+                self._resize(target)
+        for thread in threads:
+            thread.join()
+        Profiler.start_hooks.remove(self._profile)
+        # 停止：通知全部工作进程结束课程并退出，事件队列处理完毕后返回
+        with self.lock:
+            workers = list(self.workers.values())
+        for worker in workers:
+            worker.commands.put(("stop",))
+        for worker in workers:
+            worker.process.join(STOP_TIMEOUT)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self.events.put(None)
+        pump.join(STOP_TIMEOUT)
+        Cache.set_enabled(True)
+
+    # ---------- 工作进程管理 ----------
+
+    def _start_worker(self, worker_id, workers):
+        self.workers[worker_id] = _Worker(self.context, worker_id, self.config, self.events, workers)
+
+    def _send(self, worker_id, command):
+        worker = self.workers.get(worker_id)
+        if worker is not None:
+            worker.commands.put(command)
+
+    def _resize(self, count):
+        # 调整工作进程数，并迁移哈希环上归属发生变化的课程
+        with self.lock:
+            active = sorted(worker_id for worker_id in self.workers if worker_id not in self.retiring)
+            for _ in range(count - len(active)):
+                worker_id = self.next_worker_id
+                self.next_worker_id += 1
+                self._start_worker(worker_id, count)
+                self.ring.add(worker_id)
+            removed = active[count:] if count < len(active) else []
+            for worker_id in removed:
+                self.ring.remove(worker_id)
+                self.retiring.add(worker_id)
+            moved = 0
+            for key, (worker_id, name, account, info) in self.assigned.items():
+                if key not in self.moving and self.ring.owner(key) != worker_id:
+                    self.moving.add(key)
+                    moved += 1
+                    if worker_id not in self.retiring:
+                        self._send(worker_id, ("drop", key))
+            # 留下的工作进程按新的进程数调整PPT缓存容量
+            if count != len(active):
+                for worker_id in active[:count]:
+                    self._send(worker_id, ("cache_limit", Cache.worker_cache_bytes(self.config, count)))
+            for worker_id in removed:
+                self._send(worker_id, ("retire",))
+        if self.target != count:
+            self.sink.add_message("工作进程数调整为%d，迁移%d个课程" % (count, moved),0)
+        self.target = count
+
+    def _profile(self, mode, seconds):
+        with self.lock:
+            for worker_id in self.workers:
+                if worker_id not in self.retiring:
+                    self._send(worker_id, ("profile", mode, seconds))
+
+    def _check_workers(self):
+        # 异常退出的工作进程以相同编号重启，哈希环不变，原有课程重新在该进程中启动
+        restarted = []
+        with self.lock:
+            for worker_id, worker in list(self.workers.items()):
+                if worker.process.is_alive():
+                    continue
+                if worker_id in self.retiring:
+                    del self.workers[worker_id]
+                    self.retiring.discard(worker_id)
+                    continue
+                self._start_worker(worker_id, self.target)
+                self.restarts += 1
+                restarted.append((worker_id, worker.process.exitcode))
+                for key, (owner, name, account, info) in self.assigned.items():
+                    if owner == worker_id:
+                        self.moving.discard(key)
+                        self._send(worker_id, ("start", key, name, account, info))
+        for worker_id, exitcode in restarted:
+            self.sink.add_message("工作进程%d异常退出（退出码%s），已重启" % (worker_id, exitcode),8)
+
+    def _ended(self, worker_id, key):
+        # 课程在工作进程中结束：迁移中的课程在新归属的进程中启动，其余移出分配表（仍在上课时由轮询重新分配）
+        with self.lock:
+            entry = self.assigned.get(key)
+            if entry is None or entry[0] != worker_id:
+                return
+            if key in self.moving and self.sink.is_active:
+                self.moving.discard(key)
+                owner = self.ring.owner(key)
+                self.assigned[key] = (owner,) + entry[1:]
+                self._send(owner, ("start", key) + entry[1:])
+            else:
+                self.moving.discard(key)
+                del self.assigned[key]
+
+    # ---------- 事件 ----------
+
+    def _pump(self):
+        # 把工作进程的事件转交给主输出
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            kind = event[0]
+            try:
+                if kind == "message":
+                    self.sink.add_message(event[1], event[2])
+                elif kind == "add_course":
+                    _, row, key = event
+                    self.sink.add_course(row, key, lambda key=key: self.stats.get(key, {}))
+                elif kind == "del_course":
+                    _, key, stats = event
+                    if stats is not None:
+                        self.stats[key] = stats
+                    self.sink.del_course(key)
+                    self.stats.pop(key, None)
+                elif kind == "stats":
+                    self.stats.update(event[1])
+                elif kind == "ended":
+                    self._ended(event[1], event[2])
+                elif kind == "metrics":
+                    Metrics.set_remote("worker-%d" % event[1], event[2])
+                elif kind == "timetable":
+                    getattr(self.timetable, event[1])(*event[2])
+            except Exception as e:
+                self.sink.add_message("工作进程事件处理异常：%s" % e,0)
+
+    # ---------- 上课列表轮询 ----------
+
+    def _discover(self, sink):
+        # 单个账号的上课列表轮询，新课程分配给哈希环上的归属进程
+        sessionid = sink.config["sessionid"]
+        account = sink.config if sink.account is not None else None
+        scheduler = get_scheduler(sink.config)
+        for start in self.timetable.start_times():
+            scheduler.learn(start)
+        network_status = True
+        while sink.is_active:
+            cycle_start = time.monotonic()
+            self.timetable.prewarm_due(sink.config, sink.account)
+            try:
+                lesson_list = get_on_lesson(sessionid)
+            except requests.exceptions.ConnectionError:
+                if network_status:
+                    sink.add_message("网络异常，监听中断",8)
+                    network_status = False
+                sink.wait(NETWORK_RETRY_INTERVAL)
+                continue
+            except Exception:
+                lesson_list = []
+            if not network_status:
+                network_status = True
+                sink.add_message("网络已恢复，监听开始",8)
+            found_new = False
+            for lesson in lesson_list:
+                key = lesson_key(lesson["lessonId"], sink.account)
+                info = {"lessonId": lesson["lessonId"], "courseName": lesson["courseName"], "classroomId": lesson["classroomId"]}
+                with self.lock:
+                    if key in self.assigned:
+                        continue
+                    owner = self.ring.owner(key)
+                    self.assigned[key] = (owner, sink.account, account, info)
+                    self._send(owner, ("start", key, sink.account, account, info))
+                sink.add_message("检测到课程%s正在上课，已加入监听列表（工作进程%d）" % (lesson["courseName"], owner),7)
+                scheduler.learn(time.time())
+                found_new = True
+                Metrics.LESSONS_DISCOVERED.inc()
+            Metrics.DISCOVERY_SECONDS.observe(time.monotonic() - cycle_start)
+            sink.wait(scheduler.next_delay(found_new))
+
+    def get_stats(self):
+        with self.lock:
+            per_worker = {}
+            for worker_id, name, account, info in self.assigned.values():
+                per_worker[worker_id] = per_worker.get(worker_id, 0) + 1
+            return {
+                "workers": len(self.workers) - len(self.retiring),
+                "restarts": self.restarts,
+                "lessons": per_worker,
+                "moving": len(self.moving),
+            }
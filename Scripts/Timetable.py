@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Scripts.Utils import get_cache_dir, get_user_info
+from Scripts.Cache import get_ppt_cache
+from Scripts.Directory import get_directory
+from Scripts import Http
+
+# 课表：按班级持久化记录观察到的上课时间（星期、开始时间、时长）与最近使用的PPT，
+# 在预计上课前预热连接池、用户信息、同学目录与PPT缓存，使课程出现后签到与hello无需等待冷启动
+
+SAVE_DELAY = 5
+# 提前预热的时间（秒）
+PREWARM_LEAD = 120
+# 开始时间按分钟取整到该粒度，用于合并同一节课的多次记录
+SLOT_MINUTES = 5
+# 每个班级记录的最近PPT数
+RECENT_PRESENTATIONS = 3
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prewarm")
+
+def _slot_of(timestamp):
+    # 时间戳对应的(星期, 开始分钟)，星期一为0
+    t = time.localtime(timestamp)
+    minute = (t.tm_hour * 60 + t.tm_min) // SLOT_MINUTES * SLOT_MINUTES
+    return t.tm_wday, minute
+
+def _occurrence(weekday, minute, now):
+    # 该时段在now所在周内（从now当天起往后7天）的开始时间戳
+    t = time.localtime(now)
+    days = (weekday - t.tm_wday) % 7
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday + days, minute // 60, minute % 60, 0, 0, 0, -1))
+
+class Timetable:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # classroomid -> {"name": 课程名, "slots": [{"weekday", "minute", "duration", "seen"}], "presentations": [...],
+        #                 "accounts": [在该班级上课的账号名称，单账号时为None]}
+        self.classrooms = {}
+        # 正在进行的课程：lessonid -> (classroomid, 开始时间戳)
+        self.running = {}
+        # 已预热的 (账号名称, classroomid, 开始时间戳)
+        self.warmed = set()
+        self.save_timer = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path,"r",encoding="utf-8") as f:
+                self.classrooms = json.load(f)
+        except (OSError, ValueError):
+            self.classrooms = {}
+
+    def _save(self):
+        with self.lock:
+            self.save_timer = None
+            data = json.dumps(self.classrooms, ensure_ascii=False)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path,"w",encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def _schedule_save(self):
+        # 合并短时间内的多次写入
+        with self.lock:
+            if self.save_timer is not None:
+                return
+            self.save_timer = threading.Timer(SAVE_DELAY, self._save)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def flush(self):
+        # 立即写入尚未保存的修改（停止监听时调用）
+        with self.lock:
+            timer = self.save_timer
+        if timer is not None:
+            timer.cancel()
+            self._save()
+
+    def _classroom(self, classroomid, name=None):
+        entry = self.classrooms.setdefault(str(classroomid), {"name": name, "slots": [], "presentations": []})
+        # 旧版课表没有记录账号，重新上课后补充
+        entry.setdefault("accounts", [])
+        if name:
+            entry["name"] = name
+        return entry
+
+    def record_start(self, lessonid, classroomid, name, start_timestamp, account=None):
+        # 记录一次上课的开始时间，account为上课的账号名称，预热时使用该账号的登录信息
+        weekday, minute = _slot_of(start_timestamp)
+        with self.lock:
+            entry = self._classroom(classroomid, name)
+            changed = account not in entry["accounts"]
+            if changed:
+                entry["accounts"].append(account)
+            # 同一课程重复签到（如重新连接、多个账号在同一课程）只记录一次时段
+            if lessonid not in self.running:
+                self.running[lessonid] = (str(classroomid), start_timestamp)
+                changed = True
+                for slot in entry["slots"]:
+                    if slot["weekday"] == weekday and slot["minute"] == minute:
+                        slot["seen"] += 1
+                        break
+                else:
+                    entry["slots"].append({"weekday": weekday, "minute": minute, "duration": None, "seen": 1})
+        if changed:
+            self._schedule_save()
+
+    def record_end(self, lessonid, end_timestamp=None):
+        # 记录课程结束，更新该时段的时长（分钟）
+        if end_timestamp is None:
+            end_timestamp = time.time()
+        with self.lock:
+            running = self.running.pop(lessonid, None)
+            if running is None:
+                return
+            classroomid, start_timestamp = running
+            weekday, minute = _slot_of(start_timestamp)
+            for slot in self._classroom(classroomid)["slots"]:
+                if slot["weekday"] == weekday and slot["minute"] == minute:
+                    slot["duration"] = max(1, round((end_timestamp - start_timestamp) / 60))
+                    break
+        self._schedule_save()
+
+    def record_presentation(self, classroomid, presentationid):
+        # 记录班级最近使用的PPT，预热时优先获取
+        if presentationid is None:
+            return
+        presentationid = str(presentationid)
+        with self.lock:
+            presentations = self._classroom(classroomid)["presentations"]
+            if presentations and presentations[0] == presentationid:
+                return
+            if presentationid in presentations:
+                presentations.remove(presentationid)
+            presentations.insert(0, presentationid)
+            del presentations[RECENT_PRESENTATIONS:]
+        self._schedule_save()
+
+    def start_times(self, now=None):
+        # 全部已知时段在本周内的开始时间戳
+        if now is None:
+            now = time.time()
+        with self.lock:
+            return [_occurrence(slot["weekday"], slot["minute"], now)
+                    for entry in self.classrooms.values() for slot in entry["slots"]]
+
+    def upcoming(self, account=None, now=None, lead=PREWARM_LEAD):
+        # 账号account在lead秒内即将上课的班级，返回[(classroomid, 开始时间戳)]
+        if now is None:
+            now = time.time()
+        result = []
+        with self.lock:
+            for classroomid, entry in self.classrooms.items():
+                if account not in entry.get("accounts", ()):
+                    continue
+                for slot in entry["slots"]:
+                    start = _occurrence(slot["weekday"], slot["minute"], now)
+                    if 0 <= start - now <= lead:
+                        result.append((classroomid, start))
+        return result
+
+    def prewarm_due(self, config, account=None, now=None):
+        # 为账号account即将上课且尚未预热的班级在后台预热，config为该账号的配置，返回本次开始预热的班级
+        # 每个账号只预热自己上课的班级，用自己的登录信息请求
+        started = []
+        for classroomid, start in self.upcoming(account, now):
+            with self.lock:
+                if (account, classroomid, start) in self.warmed:
+                    continue
+                self.warmed.add((account, classroomid, start))
+                presentations = list(self.classrooms[classroomid]["presentations"])
+            _executor.submit(self._prewarm, classroomid, presentations, config)
+            started.append(classroomid)
+        return started
+
+    def _prewarm(self, classroomid, presentations, config):
+        # 用户信息请求同时建立到接口服务器的池化连接；PPT请求填充本地缓存，上课后只需条件请求
+        headers = Http.auth_headers(config["sessionid"])
+        try:
+            get_user_info(config["sessionid"])
+        except Exception:
+            return
+        get_directory(classroomid, config).prefetch()
+        cache = get_ppt_cache(config)
+        if cache is None:
+            return
+        for presentationid in presentations:
+            try:
+                cache.fetch(presentationid, headers)
+            except Exception:
+                pass
+
+_timetable = None
+_timetable_lock = threading.Lock()
+
+def set_timetable(timetable):
+    # 替换进程内共享的课表（Supervisor的工作进程将记录转交给主进程，避免多个进程同时写入课表文件）
+    global _timetable
+    with _timetable_lock:
+        _timetable = timetable
+
+def get_timetable(config):
+    # 进程内共享的课表
+    global _timetable
+    with _timetable_lock:
+        if _timetable is None:
+            _timetable = Timetable(os.path.join(get_cache_dir(config), "timetable.json"))
+        return _timetable
@@ -1,23 +1,19 @@
 import threading
-import pyttsx3
-import json
+import time
 import urllib3
-import requests
 import random
 import os
 import sys
+from Scripts import Http, Decoder
 
-lock = threading.Lock()
-
-def say_something(text):
-    # 带线程锁的语音函数
-    lock.acquire()
-    pyttsx3.speak(text)
-    lock.release()
+def say_something(text, type=0):
+    # 语音播报：交给Scripts.Speech的常驻播报线程，按信息类型排优先级，不阻塞调用方
+    from Scripts.Speech import get_speaker
+    return get_speaker().say(text, type)
     
 def dict_result(text):
-    # json string 转 dict object
-    return dict(json.loads(text))
+    # json string/bytes 转 dict object，解码后端见Scripts.Decoder
+    return Decoder.loads(text)
 
 def test_network():
     # 网络状态测试
@@ -61,6 +57,8 @@ def get_initial_data():
     initial_data = \
     {
         "sessionid":"",
+        # 同时监听的其他账号：[{"sessionid": "...", "name": "显示名称"}]，其余配置项可按账号覆盖
+        "accounts":[],
         "auto_danmu":True,
         "danmu_config":{
             "danmu_limit":5
@@ -87,49 +85,99 @@ def get_initial_data():
                 }
             }
         },
-        "debug_mode":False
+        "debug_mode":False,
+        # 监听引擎：thread（每个课程一个线程）或 asyncio（单事件循环，需要aiohttp）
+        "engine":"thread",
+        # PPT本地缓存容量（MB），0为不缓存
+        "ppt_cache_mb":200,
+        # JSON解码后端：auto / orjson / msgspec / json
+        "json_backend":"auto",
+        # 接口地址，留空使用雨课堂官方地址；压测时可指向本地的Scripts.MockServer
+        "api_base":"",
+        "wss_url":"",
+        # 上课列表轮询间隔（秒）：上课时间附近使用fast，其余时间逐步退避至idle
+        "discovery_fast_interval":3,
+        "discovery_idle_interval":30,
+        # websocket心跳间隔与超时（秒），超过二者之和未收到任何数据时重新连接；间隔为0时不发送心跳
+        "ws_ping_interval":20,
+        "ws_ping_timeout":10,
+        # 信息区最多保留的行数，以及各类信息每秒最多显示的条数（类型见MainWindow_Ui.audio）
+        "max_log_lines":2000,
+        "message_rate_limits":{"0":20,"1":5,"2":10},
+        # 工作进程数：大于0时课程按一致性哈希分配到多个进程中运行（每个进程内为线程模式），0为不使用
+        "supervisor_workers":0,
+        # 运行指标：本地HTTP接口端口（/metrics为Prometheus格式，/metrics.json为JSON），0为不开启；
+        # 以及定期写入的JSON快照文件与间隔（秒），留空为不写入
+        "metrics_port":0,
+        "metrics_snapshot_path":"",
+        "metrics_snapshot_interval":60,
+        # 消息处理的性能分析：模式（sample为调用栈采样，cprofile为cProfile）、时长（秒）、报告的消息类型数，
+        # 以及是否在开始监听时分析一次（debug_mode开启时同样会分析）
+        "profile_mode":"sample",
+        "profile_seconds":30,
+        "profile_top":10,
+        "profile_on_start":False
     }
     return initial_data
 
 def get_config_path():
     # 获取配置文件路径
-    config_route = get_config_dir() + "\\config.json"
+    config_route = os.path.join(get_config_dir(), "config.json")
     return config_route
 
 def get_config_dir():
     # 获取配置文件所在文件夹
-    appdata_route = os.environ['APPDATA']
-    dir_route = appdata_route + "\\RainClassroomAssistant"
+    # Windows下位于%APPDATA%，其他系统（无界面模式）位于~/.config
+    appdata_route = os.environ.get('APPDATA') or os.path.join(os.path.expanduser("~"), ".config")
+    dir_route = os.path.join(appdata_route, "RainClassroomAssistant")
     return dir_route
 
-def get_user_info(sessionid):
-    # 获取用户信息
-    headers = {
-        "Cookie":"sessionid=%s" % sessionid,
-        "User-Agent":"Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0",
-    }
-    r = requests.get(url="https://changjiang.yuketang.cn/api/v3/user/basic-info",headers=headers,proxies={"http": None,"https":None})
-    rtn = dict_result(r.text)
+def get_cache_dir(config):
+    # 获取本地缓存所在文件夹（PPT缓存、同学目录等），可由配置项cache_dir指定
+    return config.get("cache_dir") or get_config_dir()
+
+# 用户信息缓存：sessionid -> (过期时间, code, data)，只缓存成功的结果
+USER_INFO_TTL = 600
+_user_info_cache = {}
+_user_info_lock = threading.Lock()
+
+def get_user_info(sessionid, fresh=False):
+    # 获取用户信息，同一sessionid在USER_INFO_TTL秒内复用缓存；fresh为True时强制请求（用于检查登录状态）
+    if not fresh:
+        with _user_info_lock:
+            cached = _user_info_cache.get(sessionid)
+        if cached is not None and cached[0] > time.monotonic():
+            return (cached[1],cached[2])
+    headers = Http.auth_headers(sessionid)
+    r = Http.get(url=Http.api_url("/api/v3/user/basic-info"),headers=headers)
+    rtn = dict_result(r.content)
+    with _user_info_lock:
+        if rtn["code"] == 0:
+            _user_info_cache[sessionid] = (time.monotonic() + USER_INFO_TTL, rtn["code"], rtn["data"])
+        else:
+            _user_info_cache.pop(sessionid, None)
     return (rtn["code"],rtn["data"])
 
+def invalidate_user_info(sessionid=None):
+    # 登录后清除用户信息缓存，sessionid为None时全部清除
+    with _user_info_lock:
+        if sessionid is None:
+            _user_info_cache.clear()
+        else:
+            _user_info_cache.pop(sessionid, None)
+
 def get_on_lesson(sessionid):
     # 获取用户当前正在上课列表
-    headers = {
-        "Cookie":"sessionid=%s" % sessionid,
-        "User-Agent":"Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0",
-    }
-    r = requests.get("https://changjiang.yuketang.cn/api/v3/classroom/on-lesson",headers=headers,proxies={"http": None,"https":None})
-    rtn = dict_result(r.text)
+    headers = Http.auth_headers(sessionid)
+    r = Http.get(Http.api_url("/api/v3/classroom/on-lesson"),headers=headers)
+    rtn = dict_result(r.content)
     return rtn["data"]["onLessonClassrooms"]
 
 def get_on_lesson_old(sessionid):
     # 获取用户当前正在上课的列表（旧版）
-    headers = {
-        "Cookie":"sessionid=%s" % sessionid,
-        "User-Agent":"Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0",
-    }
-    r = requests.get("https://www.yuketang.cn/v/course_meta/on_lesson_courses",headers=headers,proxies={"http": None,"https":None})
-    rtn = dict_result(r.text)
+    headers = Http.auth_headers(sessionid)
+    r = Http.get("https://www.yuketang.cn/v/course_meta/on_lesson_courses",headers=headers)
+    rtn = dict_result(r.content)
     return rtn["on_lessons"]
 
 def resource_path(relative_path):
@@ -0,0 +1,68 @@
+import time
+import threading
+
+# 连接存活检查：所有课程共用一个后台线程，定期检查各课程最后一次收到消息或pong的时间，
+# 超过心跳间隔与超时之和仍无任何数据时主动断开，由Lesson的重连逻辑重新连接
+
+CHECK_INTERVAL = 1
+
+def heartbeat_config(config):
+    # 读取心跳配置，返回(ping_interval, ping_timeout)，interval为0时不发送心跳
+    interval = config.get("ws_ping_interval", 20) or 0
+    timeout = config.get("ws_ping_timeout", 10) or 0
+    if interval <= 0:
+        return 0, 0
+    # websocket-client要求ping_interval大于ping_timeout
+    timeout = min(timeout, interval * 0.8) if timeout > 0 else interval * 0.5
+    return interval, timeout
+
+class Watchdog:
+    def __init__(self):
+        self.cond = threading.Condition()
+        # Lesson.key -> Lesson
+        self.lessons = {}
+        self.thread = None
+        self.stale_reconnects = 0
+
+    def watch(self, lesson):
+        with self.cond:
+            self.lessons[lesson.key] = lesson
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="ws-watchdog", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def unwatch(self, lesson):
+        with self.cond:
+            self.lessons.pop(lesson.key, None)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.lessons:
+                    self.cond.wait()
+                lessons = list(self.lessons.values())
+            now = time.monotonic()
+            for lesson in lessons:
+                if lesson.check_liveness(now):
+                    with self.cond:
+                        self.stale_reconnects += 1
+            time.sleep(CHECK_INTERVAL)
+
+    def stats(self):
+        # 连接陈旧度：各课程距最后一次收到数据的秒数
+        now = time.monotonic()
+        with self.cond:
+            lessons = list(self.lessons.values())
+            reconnects = self.stale_reconnects
+        staleness = [lesson.staleness(now) for lesson in lessons if lesson.connected]
+        return {
+            "lessons": len(lessons),
+            "max_staleness": max(staleness) if staleness else 0,
+            "stale_reconnects": reconnects,
+        }
+
+_watchdog = Watchdog()
+
+def get_watchdog():
+    return _watchdog
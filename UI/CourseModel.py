@@ -0,0 +1,96 @@
+import time
+from PyQt5 import QtCore
+
+# 监听列表的数据模型：按lessonId索引，插入、删除均为O(1)
+# 删除时将最后一行移到被删除的位置（交换删除），只通知受影响的行，不触发整表重绘
+# 统计列由定时器调用refresh_stats更新，只对统计列发出一次dataChanged
+
+HEADERS = ["课程名", "课程标题", "教师", "上课时间", "消息/秒", "延迟(ms)", "重连"]
+INFO_COLUMNS = 4
+
+class CourseTableModel(QtCore.QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 每行：{"key", "row", "stats", "values", "messages", "time"}
+        self.rows = []
+        # lessonid -> 行号
+        self.positions = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            entry = self.rows[index.row()]
+            if column < INFO_COLUMNS:
+                return str(entry["row"][column]) if column < len(entry["row"]) else ""
+            return entry["values"][column - INFO_COLUMNS]
+        if role == QtCore.Qt.TextAlignmentRole and column >= INFO_COLUMNS:
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        return None
+
+    def add_course(self, row, key, stats=None):
+        # 加入课程，已存在时更新课程信息
+        position = self.positions.get(key)
+        if position is not None:
+            self.rows[position].update(row=row, stats=stats)
+            self.dataChanged.emit(self.index(position, 0), self.index(position, INFO_COLUMNS - 1))
+            return
+        position = len(self.rows)
+        self.beginInsertRows(QtCore.QModelIndex(), position, position)
+        self.rows.append({"key": key, "row": row, "stats": stats, "values": ["", "", ""], "messages": None, "time": None})
+        self.positions[key] = position
+        self.endInsertRows()
+
+    def del_course(self, key):
+        # 移除课程：最后一行移到被删除的位置后删除最后一行
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        last = len(self.rows) - 1
+        if position != last:
+            moved = self.rows[last]
+            self.rows[position] = moved
+            self.positions[moved["key"]] = position
+            self.dataChanged.emit(self.index(position, 0), self.index(position, len(HEADERS) - 1))
+        self.beginRemoveRows(QtCore.QModelIndex(), last, last)
+        self.rows.pop()
+        self.endRemoveRows()
+
+    def refresh_stats(self):
+        # 读取各课程的实时统计，计算消息速率
+        if not self.rows:
+            return
+        now = time.monotonic()
+        changed = False
+        for entry in self.rows:
+            if entry["stats"] is None:
+                continue
+            try:
+                stats = entry["stats"]()
+            except Exception:
+                continue
+            messages = stats.get("messages", 0)
+            rate = ""
+            if entry["messages"] is not None and now > entry["time"]:
+                rate = "%.1f" % ((messages - entry["messages"]) / (now - entry["time"]))
+            entry["messages"] = messages
+            entry["time"] = now
+            latency = stats.get("latency")
+            values = [rate, "" if latency is None else "%.1f" % (latency * 1000), str(stats.get("reconnects", 0))]
+            if values != entry["values"]:
+                entry["values"] = values
+                changed = True
+        if changed:
+            self.dataChanged.emit(self.index(0, INFO_COLUMNS), self.index(len(self.rows) - 1, len(HEADERS) - 1))
@@ -9,10 +9,10 @@
 
 
 from PyQt5 import QtCore, QtGui, QtWidgets
-from Scripts.Utils import dict_result, get_config_path, resource_path
+from Scripts.Utils import dict_result, get_config_path, resource_path, invalidate_user_info
 import websocket
-import requests
 import json
+from Scripts import Http
 import threading
 import time
 
@@ -134,13 +134,13 @@ class Login_Ui(object):
             data = dict_result(message)
             # 二维码刷新
             if data["op"] == "requestlogin":
-                img = requests.get(url=data["ticket"],proxies={"http": None,"https":None}).content
+                img = Http.get(url=data["ticket"]).content
                 img_pixmap = QtGui.QPixmap()
                 img_pixmap.loadFromData(img)
                 self.QRcode.setPixmap(img_pixmap)
             # 扫码且登录成功
             elif data["op"] == "loginsuccess":
-                web_login_url = "https://changjiang.yuketang.cn/pc/web_login"
+                web_login_url = Http.api_url("/pc/web_login")
                 login_data = {
                     "UserID":data["UserID"],
                     "Auth":data["Auth"]
@@ -150,13 +150,15 @@ class Login_Ui(object):
                 }
                 login_data = json.dumps(login_data)
                 # 使用Auth和UserID正式登录获取sessionid
-                r = requests.post(url=web_login_url,data=login_data,headers=headers,proxies={"http": None,"https":None})
+                r = Http.post(url=web_login_url,data=login_data,headers=headers)
                 sessionid = dict(r.cookies)["sessionid"]
+                # 重新登录后旧的用户信息缓存失效
+                invalidate_user_info()
                 config = self.config
                 config["sessionid"] = sessionid
                 self.save(sessionid)
                 Dialog.accept()
-        login_wss_url = "wss://changjiang.yuketang.cn/wsapp/"
+        login_wss_url = Http.WSS_URL
         # 开启websocket线程和定时刷新二维码线程
         self.wsapp = websocket.WebSocketApp(url=login_wss_url,on_open=on_open,on_message=on_message,on_close=on_close)
         self.wsapp_t = threading.Thread(target=self.wsapp.run_forever,daemon=True)
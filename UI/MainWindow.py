@@ -11,23 +11,65 @@
 from PyQt5 import QtCore, QtGui, QtWidgets
 from UI.Login import Login_Ui
 from UI.Config import Config_Ui
+from UI.CourseModel import CourseTableModel
 from Scripts.Utils import *
 from Scripts.Monitor import monitor
+from Scripts.Sink import EventSink, MessageBatcher
+from Scripts.Speech import get_speaker
+from Scripts import Http, Profiler
 import os
 import json
-import datetime
 import threading
-    
+
+# 信息区刷新间隔（毫秒）
+MESSAGE_FLUSH_INTERVAL = 50
+# 监听列表统计刷新间隔（毫秒）
+STATS_REFRESH_INTERVAL = 1000
+
+class QtEventSink(EventSink):
+    # 将Lesson/monitor的事件通过信号槽转发到主窗体
+    def __init__(self, main_ui):
+        self.main_ui = main_ui
+        self.stop_cond = threading.Condition()
+        self.stop_callbacks = []
+
+    @property
+    def config(self):
+        # 配置对话框保存后main_ui.config会被替换，这里总是读取最新配置
+        return self.main_ui.config
+
+    @property
+    def is_active(self):
+        return self.main_ui.is_active
+
+    @is_active.setter
+    def is_active(self, value):
+        self.main_ui.is_active = value
+
+    def add_message(self, message, type=0):
+        # 不逐条发送信号，放入缓冲由UI线程定时批量显示
+        self.main_ui.messages.add(message,type)
+
+    def add_course(self, row, lessonid, stats=None):
+        self.main_ui.add_course_signal.emit(row,lessonid,stats)
+
+    def del_course(self, lessonid):
+        self.main_ui.del_course_signal.emit(lessonid)
+
 class MainWindow_Ui(QtCore.QObject):
     # 需要建立信号槽，解决无法在线程中修改UI值问题
     add_message_signal = QtCore.pyqtSignal(str,int)
-    add_course_signal = QtCore.pyqtSignal(list,int)
-    del_course_signal = QtCore.pyqtSignal(int)
+    add_course_signal = QtCore.pyqtSignal(list,object,object)
+    del_course_signal = QtCore.pyqtSignal(object)
+    stopped_signal = QtCore.pyqtSignal()
 
     def setupUi(self, MainWindow):
         # 对象变量初始化
-        self.table_index = []
         self.is_active = False
+        self.messages = MessageBatcher()
+        self.sink = QtEventSink(self)
+        # 语音引擎初始化失败时提示一次，之后不再播报
+        get_speaker().on_error = lambda error: self.sink.add_message("语音播报不可用：%s" % error,0)
 
         MainWindow.setObjectName("MainWindow")
         MainWindow.resize(800, 700)
@@ -101,7 +143,7 @@ class MainWindow_Ui(QtCore.QObject):
         self.Table.setObjectName("Table")
         self.verticalLayout_3 = QtWidgets.QVBoxLayout(self.Table)
         self.verticalLayout_3.setObjectName("verticalLayout_3")
-        self.tableWidget = QtWidgets.QTableWidget(self.Table)
+        self.tableWidget = QtWidgets.QTableView(self.Table)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
@@ -111,16 +153,8 @@ class MainWindow_Ui(QtCore.QObject):
         self.tableWidget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.tableWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.tableWidget.setObjectName("tableWidget")
-        self.tableWidget.setColumnCount(4)
-        self.tableWidget.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget.setHorizontalHeaderItem(3, item)
+        self.course_model = CourseTableModel(self.tableWidget)
+        self.tableWidget.setModel(self.course_model)
         self.tableWidget.horizontalHeader().setHighlightSections(False)
         self.tableWidget.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.tableWidget.verticalHeader().setVisible(False)
@@ -158,11 +192,23 @@ class MainWindow_Ui(QtCore.QObject):
         self.add_message_signal.connect(self.add_message)
         self.add_course_signal.connect(self.add_course)
         self.del_course_signal.connect(self.del_course)
+        self.stopped_signal.connect(self.on_stopped)
 
         # 配置文件检查
         dir_route = get_config_dir()
         config_route = get_config_path()
         self.config = self.check_config(dir_route, config_route)
+        Http.set_base_urls(self.config.get("api_base"), self.config.get("wss_url"))
+        self.apply_message_config()
+
+        # 定时批量显示缓冲中的信息
+        self.flush_timer = QtCore.QTimer(MainWindow)
+        self.flush_timer.timeout.connect(self.flush_messages)
+        self.flush_timer.start(MESSAGE_FLUSH_INTERVAL)
+        # 定时刷新监听列表中的统计列
+        self.stats_timer = QtCore.QTimer(MainWindow)
+        self.stats_timer.timeout.connect(self.course_model.refresh_stats)
+        self.stats_timer.start(STATS_REFRESH_INTERVAL)
 
         self.add_message_signal.emit("当前版本：v0.0.4",0)
         self.add_message_signal.emit("初始化完成",0)
@@ -184,39 +230,17 @@ class MainWindow_Ui(QtCore.QObject):
         self.config_btn.setText(_translate("MainWindow", "配置"))
         self.Table.setTitle(_translate("MainWindow", "监听列表"))
         self.Output.setTitle(_translate("MainWindow", "信息"))
-        item = self.tableWidget.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "课程名"))
-        item = self.tableWidget.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "课程标题"))
-        item = self.tableWidget.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "教师"))
-        item = self.tableWidget.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "上课时间"))
         self.Output.setTitle(_translate("MainWindow", "信息"))
 
-    def add_course(self, row, row_count):
+    def add_course(self, row, lessonid, stats=None):
         # 添加课程
         # 注意：在非UI运行线程中调用该方法请对add_course_signal发送信号
-        self.tableWidget.insertRow(row_count)
-        # 装填当前行各列数据
-        for i in range(len(row)):
-            content = QtWidgets.QTableWidgetItem(str(row[i]))
-            self.tableWidget.setItem(row_count,i,content)
-
-        # 存储各行PersistentModelIndex，便于后续删除操作
-        model_index = self.tableWidget.indexFromItem(content)
-        per_model_index = QtCore.QPersistentModelIndex(model_index)
-        self.table_index.append((row_count,per_model_index))
-
-    def del_course(self, index):
+        self.course_model.add_course(row, lessonid, stats)
+
+    def del_course(self, lessonid):
         # 删除课程
         # 注意：在非UI运行线程中调用该方法请对del_course_signal发送信号
-        for row_count,per_model_index in self.table_index:
-            # 搜索传入index所对应的QPersistentModelIndex，并进行删除
-            # QPersistentModelIndex对象的索引在删除过程中不会被已删除元素影响
-            if row_count == index:
-                self.tableWidget.removeRow(per_model_index.row())
-                self.table_index.remove((row_count,per_model_index))
+        self.course_model.del_course(lessonid)
 
     def show_config(self):
         # 展示配置对话框
@@ -229,8 +253,13 @@ class MainWindow_Ui(QtCore.QObject):
         config_ui.enable_delay_custom()
         if dialog.exec_():
             config_route = get_config_path()
+            debug_mode = self.config.get("debug_mode")
             with open(config_route,"r") as f:
                 self.config = json.load(f)
+            self.apply_message_config()
+            # 监听中开启debug_mode时对消息处理进行一次性能分析
+            if self.is_active and self.config.get("debug_mode") and not debug_mode:
+                Profiler.start(self.sink, self.config)
 
     def show_login(self, _bool=False, rtn_message=""):
         # 展示登录对话框
@@ -288,18 +317,30 @@ class MainWindow_Ui(QtCore.QObject):
 
     def check_login(self):
         # 检查登录状态
-        code, user_info = get_user_info(self.config["sessionid"])
+        code, user_info = get_user_info(self.config["sessionid"],fresh=True)
         if code == 50000:
             return False,user_info
         elif code == 0:
             return True,user_info
             
     def add_message(self, message, type=0):
-        # 新增输出信息，并尝试语音播报
-        time = datetime.datetime.now().strftime("[%Y-%m-%d %H:%M:%S] ")
-        self.output_textarea.append(time + message)
-        if not type == 0:
-            self.audio(message,type)
+        # 新增输出信息，在下一次flush_messages时显示并尝试语音播报
+        self.messages.add(message,type)
+
+    def apply_message_config(self):
+        # 应用信息区的行数上限与各类型限速配置
+        self.output_textarea.document().setMaximumBlockCount(self.config.get("max_log_lines", 2000))
+        self.messages.set_rate_limits(self.config.get("message_rate_limits"))
+
+    def flush_messages(self):
+        # 由flush_timer定时调用：一次性追加缓冲中的全部信息
+        entries = self.messages.drain()
+        if not entries:
+            return
+        self.output_textarea.append("\n".join(text for text, _, _ in entries))
+        for _, message, type in entries:
+            if message is not None and not type == 0:
+                self.audio(message,type)
 
     def active_clicked(self):
         # 启动按钮被点击
@@ -310,23 +351,28 @@ class MainWindow_Ui(QtCore.QObject):
 
     def active(self):
         # 启动
-        self.monitor_t = threading.Thread(target=monitor,args=(self,),daemon=True)
-        self.monitor_t.start()
+        # 先置为启动状态再开启线程，避免监听线程读到旧状态后立即退出
         self.is_active = True
+        self.monitor_t = threading.Thread(target=monitor,args=(self.sink,),daemon=True)
+        self.monitor_t.start()
         self.active_btn.setText("停止监听")
         self.add_message_signal.emit("启动成功",0)
     
     def deactive(self):
-        # 停止
+        # 停止：在后台线程中等待监听线程结束（关闭各课程连接最长需要数秒），完成后通过信号恢复按钮
         self.active_btn.setText("停止中...")
         self.active_btn.setEnabled(False)
-        # 强制刷新UI
-        QtWidgets.qApp.processEvents()
-        self.is_active = False
+        threading.Thread(target=self._stop_monitor,daemon=True).start()
+
+    def _stop_monitor(self):
+        self.sink.stop()
         self.monitor_t.join()
+        self.stopped_signal.emit()
+
+    def on_stopped(self):
         self.active_btn.setEnabled(True)
         self.active_btn.setText("启动")
-        self.add_message_signal.emit("停止成功",0)
+        self.add_message("停止成功",0)
 
     def audio(self, message, type):
         '''
@@ -354,4 +400,4 @@ class MainWindow_Ui(QtCore.QObject):
             (type == 6 and audio_type["others_called"]) or \
             (type == 7 and audio_type["course_info"]) or \
             (type == 8 and audio_type["network_info"]) :
-                threading.Thread(target=say_something,args=(message,),daemon=True).start()
\ No newline at end of file
+                say_something(message,type)
\ No newline at end of file